@@ -0,0 +1,311 @@
+# Benchmark suite for the generator, PDF/TXT output, web routes and module imports
+# Runs offline against mock_deepseek_server.py and writes machine-readable JSON to compare commits
+#
+# Usage:
+#   python benchmark.py --output bench.json
+#   python benchmark.py --quick
+#   python benchmark.py --base-url http://127.0.0.1:8001/v1   (use an already running mock or recording)
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import contextlib
+import socket
+import urllib.request
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+
+# Modules timed by the cold import benchmark: every module in the repo but this one
+IMPORT_MODULES = tuple(sorted(path.stem for path in REPO_DIR.glob("*.py") if path.stem != "benchmark"))
+
+DEFAULT_POST_COUNTS = "10,100,1000,10000"
+DEFAULT_CONCURRENCY = "1,10,50"
+DEFAULT_HISTORY = "10,100,1000"
+
+
+def parse_counts(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def log(message):
+    """Progress goes to stderr so stdout stays valid JSON"""
+    print(message, file=sys.stderr)
+
+
+def summarize(samples):
+    """Timing statistics (seconds) for a list of samples"""
+    return {
+        'samples': [round(s, 6) for s in samples],
+        'min': round(min(samples), 6),
+        'median': round(statistics.median(samples), 6),
+        'mean': round(statistics.mean(samples), 6),
+        'max': round(max(samples), 6),
+        'stdev': round(statistics.stdev(samples), 6) if len(samples) > 1 else 0.0
+    }
+
+
+def measure(fn, repeat):
+    """Call fn repeat times with stdout silenced; return (timings, last result)"""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = fn()
+            samples.append(time.perf_counter() - started)
+    return summarize(samples), result
+
+
+def record(results, name, params, timings, **extra):
+    entry = {'benchmark': name, 'params': params}
+    entry.update(timings)
+    entry.update(extra)
+    results.append(entry)
+    log(f"  {name:<24} {json.dumps(params):<36} median {timings['median'] * 1000:10.2f} ms")
+
+
+def start_mock_process(latency, latency_mean):
+    """Run mock_deepseek_server.py in its own interpreter so it doesn't share our GIL"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, str(REPO_DIR / "mock_deepseek_server.py"), "--port", str(port),
+         "--latency", latency, "--latency-mean", str(latency_mean), "--seed", "0"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}/v1"
+    deadline = time.monotonic() + 10
+    while upstream_requests(base_url) is None:
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            raise RuntimeError("mock DeepSeek server did not start")
+        time.sleep(0.05)
+    return process, base_url
+
+
+def upstream_requests(base_url):
+    """Requests the mock has served so far, or None if it has no /stats"""
+    stats_url = base_url.rstrip("/").rsplit("/v1", 1)[0] + "/stats"
+    try:
+        with urllib.request.urlopen(stats_url, timeout=2) as response:
+            return json.load(response)['requests']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def scaled_prompts(prompts, count):
+    """Cycle the real prompt formats up to count posts"""
+    return [prompts[i % len(prompts)] for i in range(count)]
+
+
+def bench_imports(results, repeat):
+    """Cold import time of each module, each sample in a fresh interpreter"""
+    log("Cold imports")
+    env = dict(os.environ, PYTHONPATH=str(REPO_DIR))
+    for module in IMPORT_MODULES:
+        code = (
+            "import time; started = time.perf_counter(); "
+            f"import {module}; print(time.perf_counter() - started)"
+        )
+        samples = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True,
+                                    text=True, check=True).stdout
+            samples.append(float(output.strip().splitlines()[-1]))
+        record(results, "import", {'module': module}, summarize(samples))
+
+
+def bench_generation(results, post_counts, concurrency_levels, repeat, base_url):
+    from twitter_content_generator import TwitterContentGenerator
+
+    log("generate_daily_posts")
+    generator = TwitterContentGenerator("benchmark-key", use_cache=False, batch_mode=False)
+    base_prompts = list(generator.prompts)
+
+    posts_by_count = {}
+    for count in post_counts:
+        generator.prompts = scaled_prompts(base_prompts, count)
+        for workers in concurrency_levels:
+            requests_before = upstream_requests(base_url)
+            timings, posts = measure(lambda: generator.generate_daily_posts(max_workers=workers), repeat)
+            extra = {
+                'posts_per_second': round(count / timings['median'], 1),
+                'backups': sum(1 for post in posts if post.get('backup'))
+            }
+            if requests_before is not None:
+                extra['upstream_requests'] = upstream_requests(base_url) - requests_before
+            record(results, "generate_daily_posts", {'posts': count, 'concurrency': workers}, timings, **extra)
+            posts_by_count[count] = posts
+
+    log("create_pdf / save_as_text")
+    for count in post_counts:
+        posts = posts_by_count[count]
+        timings, filename = measure(lambda: generator.create_pdf(posts), repeat)
+        record(results, "create_pdf", {'posts': count}, timings, bytes=Path(filename).stat().st_size)
+
+        timings, _ = measure(lambda: generator.save_as_text(posts), repeat)
+        text_file = generator.output_folder / f"Twitter_Posts_{datetime.now().strftime('%Y%m%d')}.txt"
+        record(results, "save_as_text", {'posts': count}, timings, bytes=text_file.stat().st_size)
+
+    generator.prompts = base_prompts
+    return generator, posts_by_count
+
+
+def bench_routes(results, generator, posts_by_count, concurrency_levels, history_sizes, repeat):
+    from web_interface import app
+
+    client = app.test_client()
+
+    log("/generate")
+    for workers in concurrency_levels:
+        os.environ["DEEPSEEK_MAX_WORKERS"] = str(workers)
+        # ?wait=1 runs the job in the request, so the timing covers the whole run
+        timings, response = measure(lambda: client.post('/generate?wait=1'), repeat)
+        record(results, "route_generate", {'posts': len(generator.prompts), 'concurrency': workers},
+               timings, status=response.status_code)
+
+    log("/view")
+    text_name = f"Twitter_Posts_{datetime.now().strftime('%Y%m%d')}.txt"
+    for count, posts in posts_by_count.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator.save_as_text(posts)
+            generator.save_as_jsonl(posts)
+        timings, response = measure(lambda: client.get(f'/view/{text_name}'), repeat)
+        record(results, "route_view", {'posts': count}, timings, status=response.status_code,
+               posts_returned=len(response.get_json().get('posts', [])))
+
+    log("/files")
+    output_folder = generator.output_folder
+    today = datetime.now().strftime('%Y%m%d')
+    template_pdf = output_folder / f"Twitter_Posts_{today}.pdf"
+    template_txt = output_folder / text_name
+    day = datetime.now()
+    existing = 1
+    for size in history_sizes:
+        # Grow the archive with earlier days until it holds size PDF/TXT pairs
+        while existing < size:
+            day -= timedelta(days=1)
+            stem = f"Twitter_Posts_{day.strftime('%Y%m%d')}"
+            shutil.copyfile(template_pdf, output_folder / f"{stem}.pdf")
+            shutil.copyfile(template_txt, output_folder / f"{stem}.txt")
+            existing += 1
+        timings, response = measure(lambda: client.get('/files'), repeat)
+        record(results, "route_files", {'files': size}, timings, status=response.status_code,
+               files_returned=len(response.get_json()['files']))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Twitter content generator against a mock DeepSeek API")
+    parser.add_argument("--posts", default=DEFAULT_POST_COUNTS,
+                        help=f"comma-separated post counts (default: {DEFAULT_POST_COUNTS})")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY,
+                        help=f"comma-separated requests in flight (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--history", default=DEFAULT_HISTORY,
+                        help=f"comma-separated archive sizes for /files (default: {DEFAULT_HISTORY})")
+    parser.add_argument("--repeat", type=int, default=3, help="samples per benchmark (default: 3)")
+    parser.add_argument("--latency-mean", type=float, default=0.01,
+                        help="mock upstream latency in seconds (default: 0.01)")
+    parser.add_argument("--latency", default="fixed", help="mock latency distribution (default: fixed)")
+    parser.add_argument("--base-url", default=None,
+                        help="use this upstream instead of starting a mock server")
+    parser.add_argument("--only", default=None,
+                        help="comma-separated subset of: imports,generation,routes")
+    parser.add_argument("--quick", action="store_true",
+                        help="small smoke run: 10,100 posts, concurrency 1,10, one sample")
+    parser.add_argument("--output", default=None, help="write results JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.posts, args.concurrency, args.history, args.repeat = "10,100", "1,10", "10,100", 1
+    post_counts = parse_counts(args.posts)
+    concurrency_levels = parse_counts(args.concurrency)
+    history_sizes = parse_counts(args.history)
+    only = set(args.only.split(",")) if args.only else {"imports", "generation", "routes"}
+
+    mock = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        mock, base_url = start_mock_process(args.latency, args.latency_mean)
+
+    # The client reads these on first use, so set them before importing the generators.
+    # Pacing and the breaker are opened up so the benchmark measures the code, not the limits.
+    os.environ.update({
+        "DEEPSEEK_BASE_URL": base_url,
+        "DEEPSEEK_API_KEY": os.getenv("DEEPSEEK_API_KEY") or "benchmark-key",
+        "DEEPSEEK_POOL_SIZE": str(max(concurrency_levels + [20])),
+        "DEEPSEEK_RATE_LIMIT": "1000000",
+        "DEEPSEEK_RATE_BURST": "1000000",
+        "DEEPSEEK_BREAKER_THRESHOLD": "1000000",
+        "DEEPSEEK_HEDGE_PERCENTILE": "0",
+        "DEEPSEEK_BATCH_MODE": "0",
+        "DEEPSEEK_CACHE": "0",
+        "DEDUP_ENABLED": "0"
+    })
+
+    results = []
+    started = time.perf_counter()
+    # Output/ is relative to the working directory: keep benchmark files out of the real one
+    with tempfile.TemporaryDirectory(prefix="twitter_bench_") as workdir:
+        previous_dir = os.getcwd()
+        os.chdir(workdir)
+        try:
+            if "imports" in only:
+                bench_imports(results, args.repeat)
+            if "generation" in only or "routes" in only:
+                generator, posts_by_count = bench_generation(
+                    results, post_counts, concurrency_levels, args.repeat, base_url)
+                if "routes" in only:
+                    bench_routes(results, generator, posts_by_count, concurrency_levels,
+                                 history_sizes, args.repeat)
+        finally:
+            os.chdir(previous_dir)
+            if mock:
+                mock.terminate()
+                mock.wait()
+
+    report = {
+        'meta': {
+            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'upstream': 'mock' if mock else base_url,
+            'mock_latency': {'distribution': args.latency, 'mean': args.latency_mean} if mock else None,
+            'post_counts': post_counts,
+            'concurrency': concurrency_levels,
+            'history': history_sizes,
+            'repeat': args.repeat,
+            'duration': round(time.perf_counter() - started, 3)
+        },
+        'results': results
+    }
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload, encoding="utf-8")
+        log(f"[OK] Benchmark results saved: {args.output}")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Local scoring of best-of-N completion candidates
+# Each feature is computed as one column over all candidates, then combined with fixed weights
+import re
+from tweet_length import MAX_TWEET_LENGTH, weighted_length
+
+# Meta-commentary and advice disclaimers the system prompt asks the model to leave out
+BANNED_PHRASES = (
+    "here's", "here is", "sure,", "certainly", "as an ai", "tweet:", "post:",
+    "not financial advice", "financial advice", "guaranteed", "in conclusion"
+)
+
+# Used when a format's prompt doesn't state a word limit
+DEFAULT_WORD_LIMIT = 80
+
+WEIGHTS = {'length': 0.35, 'structure': 0.2, 'novelty': 0.3, 'clean': 0.15}
+
+# Subtracted from candidates over Twitter's weighted limit, so any candidate that fits wins
+OVER_LIMIT_PENALTY = 1.0
+
+
+def format_rules(prompt):
+    """Word limit and layout asked for by a format prompt"""
+    text = prompt.lower()
+    limit = re.search(r"under (\d+) words", text)
+    max_lines = re.search(r"(\d+) lines maximum", text)
+    return {
+        'word_limit': int(limit.group(1)) if limit else DEFAULT_WORD_LIMIT,
+        'max_lines': int(max_lines.group(1)) if max_lines else None,
+        'bullets': "bullet" in text,
+        'line_breaks': "line break" in text
+    }
+
+
+def length_scores(word_counts, word_limit):
+    """1.0 within the limit (but not trivially short), decaying past it"""
+    floor = max(3, word_limit // 4)
+    return [
+        word_limit / words if words > word_limit else min(1.0, words / floor)
+        for words in word_counts
+    ]
+
+
+def structure_scores(line_counts, word_counts, longest_lines, rules):
+    """Reward the layout the format and the system prompt ask for"""
+    scores = []
+    for lines, words, longest in zip(line_counts, word_counts, longest_lines):
+        score = 1.0
+        if rules['max_lines'] and lines > rules['max_lines']:
+            score -= 0.5
+        if rules['bullets'] and lines < 4:
+            score -= 0.5
+        # Longer posts should be broken up; one long paragraph reads badly on Twitter
+        if (rules['line_breaks'] or words > 25) and lines < 2:
+            score -= 0.4
+        if longest > 35:
+            score -= 0.2
+        scores.append(max(score, 0.0))
+    return scores
+
+
+def clean_scores(candidates):
+    """0.0 for any candidate containing a banned phrase"""
+    lowered = [candidate.lower() for candidate in candidates]
+    return [0.0 if any(phrase in text for phrase in BANNED_PHRASES) else 1.0 for text in lowered]
+
+
+def score_candidates(candidates, rules, similarities=None):
+    """Weighted score per candidate; similarities are each one's closest match to earlier posts (0-1)"""
+    lines = [[line for line in candidate.split("\n") if line.strip()] for candidate in candidates]
+    word_counts = [len(candidate.split()) for candidate in candidates]
+    line_counts = [len(candidate_lines) for candidate_lines in lines]
+    longest_lines = [max((len(line.split()) for line in candidate_lines), default=0) for candidate_lines in lines]
+
+    columns = {
+        'length': length_scores(word_counts, rules['word_limit']),
+        'structure': structure_scores(line_counts, word_counts, longest_lines, rules),
+        'novelty': [1.0 - s for s in similarities] if similarities else [1.0] * len(candidates),
+        'clean': clean_scores(candidates)
+    }
+    totals = [0.0] * len(candidates)
+    for name, column in columns.items():
+        weight = WEIGHTS[name]
+        totals = [total + weight * value for total, value in zip(totals, column)]
+
+    columns['tweet_length'] = [weighted_length(candidate) for candidate in candidates]
+    totals = [total - OVER_LIMIT_PENALTY if length > MAX_TWEET_LENGTH else total
+              for total, length in zip(totals, columns['tweet_length'])]
+    return totals, columns
+
+
+def pick_best(candidates, rules, similarities=None):
+    """(index of the best candidate, its score, all scores)"""
+    totals, _ = score_candidates(candidates, rules, similarities)
+    best = max(range(len(candidates)), key=totals.__getitem__)
+    return best, totals[best], totals
@@ -0,0 +1,123 @@
+# Circuit breaker for the DeepSeek API
+# After repeated failures, requests fail fast (callers fall back to backup content) until a probe succeeds
+import os
+import time
+import threading
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the breaker is open"""
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures.
+
+    While open every request is refused. Once cooldown seconds have passed
+    the breaker goes half-open and lets a single probe through: success closes
+    it, failure re-opens it for another cooldown. A probe that never reports
+    back (its caller was cancelled) frees the slot after probe_timeout seconds.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=30.0, probe_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """True if a request may be sent now (claims the probe slot when half-open)"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight and now - self._probe_started >= self.probe_timeout:
+                self._probe_in_flight = False
+
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe_started = now
+                return True
+
+            self.rejected += 1
+            return False
+
+    def check(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        if not self.allow_request():
+            raise CircuitOpenError("DeepSeek circuit breaker is open; skipping API call")
+
+    def release_probe(self):
+        """Free the probe slot without a verdict, e.g. when the probe was cancelled"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def record_status(self, status_code):
+        """Server errors count as failures; anything else proves the API is up"""
+        if status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def stats(self):
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(self.cooldown - (time.monotonic() - self.opened_at), 0.0), 3)
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'cooldown': self.cooldown,
+                'probe_in': retry_in,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected
+            }
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker():
+    """Return the process-wide breaker, configured from the environment"""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    failure_threshold=int(os.getenv("DEEPSEEK_BREAKER_THRESHOLD", "5")),
+                    cooldown=float(os.getenv("DEEPSEEK_BREAKER_COOLDOWN", "30")),
+                    probe_timeout=float(os.getenv("DEEPSEEK_BREAKER_PROBE_TIMEOUT", "60"))
+                )
+    return _breaker
@@ -0,0 +1,198 @@
+# Near-duplicate index over every post ever generated
+# MinHash signatures of character shingles, bucketed with LSH bands in SQLite for sub-linear lookups
+import os
+import re
+import array
+import random
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Candidates fetched per band; caps the cost of very popular buckets (e.g. repeated backups)
+_BUCKET_LIMIT = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dedup_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS dedup_posts (
+    id INTEGER PRIMARY KEY,
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dedup_buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    post_id INTEGER NOT NULL
+);
+-- post_id in the index lets "newest N in a bucket" stop after N rows instead of sorting the bucket
+DROP INDEX IF EXISTS dedup_buckets_lookup;
+CREATE INDEX IF NOT EXISTS dedup_buckets_recent ON dedup_buckets (band, bucket, post_id);
+"""
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def shingles(text, size=5):
+    """Set of character shingles of the normalized text"""
+    text = normalize(text)
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / len(signature_a)
+
+
+class NearDuplicateIndex:
+    """Persistent MinHash/LSH index of post texts
+
+    Each post gets a num_perm MinHash signature, split into bands of
+    num_perm / bands rows. Posts sharing any band bucket become candidates
+    and are confirmed by estimated Jaccard similarity >= threshold, so a
+    lookup touches a handful of indexed rows however long the history is.
+    """
+
+    def __init__(self, path, threshold=0.7, num_perm=64, bands=16, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = Path(path)
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # A seeded SHAKE-128 stream gives each shingle num_perm independent 32-bit hashes in one call
+        self._hasher = hashlib.shake_128(random.Random(seed).randbytes(16))
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            self._check_parameters(seed)
+
+    def _check_parameters(self, seed):
+        """Signatures are only comparable if they were built with the same parameters"""
+        params = f"{self.num_perm}:{self.bands}:{self.shingle_size}:{seed}"
+        row = self._conn.execute("SELECT value FROM dedup_meta WHERE key = 'params'").fetchone()
+        if row is None:
+            self._conn.execute("INSERT INTO dedup_meta (key, value) VALUES ('params', ?)", (params,))
+        elif row[0] != params:
+            raise ValueError(f"{self.path} was built with MinHash parameters {row[0]}, not {params}")
+
+    def signature(self, text):
+        """MinHash signature of text as a tuple of num_perm ints"""
+        size = self.num_perm * 4
+        rows = []
+        for shingle in shingles(text, self.shingle_size):
+            hasher = self._hasher.copy()
+            hasher.update(shingle.encode("utf-8"))
+            rows.append(array.array("I", hasher.digest(size)))
+        # Column-wise minimum: one min per hash function
+        return tuple(map(min, zip(*rows)))
+
+    def _band_keys(self, signature):
+        """(band, bucket) pairs; bucket is a signed 64-bit hash of the band's rows"""
+        keys = []
+        for band in range(self.bands):
+            rows = array.array("I", signature[band * self.rows:(band + 1) * self.rows]).tobytes()
+            digest = hashlib.blake2b(rows, digest_size=8).digest()
+            keys.append((band, int.from_bytes(digest, "big", signed=True)))
+        return keys
+
+    def find_duplicate(self, text=None, signature=None, max_age_days=None, min_similarity=None):
+        """Most similar indexed post at or above threshold, or None
+
+        Returns {'id', 'content', 'created_at', 'similarity'}. max_age_days
+        limits the comparison to recent history; min_similarity overrides
+        the threshold (0 returns the closest LSH candidate, if any).
+        """
+        signature = signature or self.signature(text)
+        threshold = self.threshold if min_similarity is None else min_similarity
+        since = None
+        if max_age_days:
+            since = (datetime.now() - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+        with self._lock:
+            candidates = set()
+            for band, bucket in self._band_keys(signature):
+                rows = self._conn.execute(
+                    "SELECT post_id FROM dedup_buckets WHERE band = ? AND bucket = ? "
+                    "ORDER BY post_id DESC LIMIT ?", (band, bucket, _BUCKET_LIMIT)
+                ).fetchall()
+                candidates.update(row[0] for row in rows)
+            if not candidates:
+                return None
+
+            placeholders = ",".join("?" * len(candidates))
+            rows = self._conn.execute(
+                f"SELECT id, content, created_at, signature FROM dedup_posts WHERE id IN ({placeholders})",
+                list(candidates)
+            ).fetchall()
+
+        best = None
+        for post_id, content, created_at, blob in rows:
+            if since and created_at < since:
+                continue
+            score = similarity(signature, array.array("I", blob))
+            if score >= threshold and (best is None or score > best['similarity']):
+                best = {'id': post_id, 'content': content, 'created_at': created_at,
+                        'similarity': round(score, 3)}
+        return best
+
+    def add_many(self, texts):
+        """Index posts in one transaction; returns their ids"""
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        prepared = [(text, self.signature(text)) for text in texts]
+        ids = []
+        with self._lock, self._conn:
+            for text, signature in prepared:
+                cursor = self._conn.execute(
+                    "INSERT INTO dedup_posts (content, created_at, signature) VALUES (?, ?, ?)",
+                    (text, created_at, array.array("I", signature).tobytes())
+                )
+                post_id = cursor.lastrowid
+                self._conn.executemany(
+                    "INSERT INTO dedup_buckets (band, bucket, post_id) VALUES (?, ?, ?)",
+                    [(band, bucket, post_id) for band, bucket in self._band_keys(signature)]
+                )
+                ids.append(post_id)
+        return ids
+
+    def add(self, text):
+        return self.add_many([text])[0]
+
+    def stats(self):
+        with self._lock:
+            posts = self._conn.execute("SELECT COUNT(*) FROM dedup_posts").fetchone()[0]
+        return {'posts': posts, 'threshold': self.threshold, 'num_perm': self.num_perm, 'bands': self.bands}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_dedup_index():
+    """Return the process-wide index, configured from the environment"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NearDuplicateIndex(
+                    os.getenv("DEDUP_INDEX_PATH", "Output/post_history.db"),
+                    threshold=float(os.getenv("DEDUP_THRESHOLD", "0.7"))
+                )
+    return _index
@@ -0,0 +1,363 @@
+# Shared DeepSeek HTTP transport
+# One pooled keep-alive session per process, shared by every generator instance and thread
+import os
+import json
+import time
+import asyncio
+import threading
+import requests
+import httpx
+from requests.adapters import HTTPAdapter
+from rate_limiter import get_rate_limiter
+from retry_policy import RetryPolicy, DeadlineExceeded
+from circuit_breaker import get_circuit_breaker
+from metrics import observe_upstream_attempt
+from dotenv import load_dotenv
+
+# Settings below are read at import time, so pick up .env before anything else
+load_dotenv()
+
+# Override with DEEPSEEK_BASE_URL to point every generator at another endpoint (e.g. mock_deepseek_server.py)
+DEFAULT_BASE_URL = "https://api.deepseek.com/v1"
+
+# Connections kept open per host; should cover the largest number of requests in flight
+POOL_SIZE = int(os.getenv("DEEPSEEK_POOL_SIZE", "20"))
+
+# Timeouts and retry counts used when a caller doesn't pass its own policy
+default_retry_policy = RetryPolicy.from_env()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def api_url():
+    """Chat completions endpoint under the configured base URL"""
+    base_url = os.getenv("DEEPSEEK_BASE_URL") or DEFAULT_BASE_URL
+    return base_url.rstrip("/") + "/chat/completions"
+
+
+def get_session():
+    """Return the process-wide pooled requests.Session (created on first use)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["Connection"] = "keep-alive"
+                _session = session
+    return _session
+
+
+def async_client():
+    """Create an httpx.AsyncClient with the same pool limits as the shared session
+
+    Async clients are bound to one event loop, so callers own and close them.
+    """
+    limits = httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)
+    return httpx.AsyncClient(limits=limits)
+
+
+def connection_stats():
+    """Return request and connection counters for the shared session
+
+    'connections_opened' counts TCP+TLS handshakes; every other request reused
+    a kept-alive connection.
+    """
+    requests_sent = 0
+    connections_opened = 0
+
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_sent += pool.num_requests
+                connections_opened += pool.num_connections
+
+    return {
+        'requests': requests_sent,
+        'connections_opened': connections_opened,
+        'connections_reused': max(requests_sent - connections_opened, 0),
+        'pool_size': POOL_SIZE
+    }
+
+
+def _should_retry(policy, budget, attempt, status_code=None):
+    """Decide whether a failed attempt gets another try"""
+    if attempt >= policy.max_attempts:
+        return False
+    if status_code is not None and not policy.is_retryable(status_code):
+        return False
+    return budget is None or budget.try_spend()
+
+
+def _deadline_passed(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def _cut_by_deadline(policy, timeout, error):
+    """True if error is a timeout that only fired because the deadline shortened it
+
+    Such a request was abandoned by the caller, so it says nothing about
+    the API and must not open the breaker or slow the rate limiter.
+    """
+    return (isinstance(error, (requests.Timeout, httpx.TimeoutException))
+            and tuple(timeout) != (policy.connect_timeout, policy.read_timeout))
+
+
+def post_completion(headers, data, retry_policy=None, budget=None, deadline=None):
+    """POST a chat completion through the shared session, paced by the rate limiter
+
+    Transient failures are retried per retry_policy (charged to budget when
+    given). Returns (response, attempts): response is None if the last attempt
+    raised, and attempts holds one {'attempt', 'status', 'latency', 'error'}
+    record per try. Raises CircuitOpenError without sending anything while
+    the circuit breaker is open.
+
+    deadline is a time.monotonic() timestamp: timeouts shrink to fit it, no
+    retry starts after it, and DeadlineExceeded is raised if it has already
+    passed before the first attempt.
+    """
+    policy = retry_policy or default_retry_policy
+    limiter = get_rate_limiter()
+    breaker = get_circuit_breaker()
+    response = None
+    attempts = []
+
+    for attempt in range(1, policy.max_attempts + 1):
+        # Fail fast while the API is known to be down or the deadline has passed
+        if not attempts:
+            if _deadline_passed(deadline):
+                raise DeadlineExceeded("deadline passed before the request was sent")
+            breaker.check()
+        elif _deadline_passed(deadline) or not breaker.allow_request():
+            return response, attempts
+
+        limiter.acquire()
+        timeout = policy.timeouts(deadline)
+        started = time.perf_counter()
+        try:
+            response = get_session().post(api_url(), headers=headers, json=data, timeout=timeout)
+        except requests.RequestException as e:
+            if _cut_by_deadline(policy, timeout, e):
+                breaker.release_probe()
+            else:
+                limiter.record_error()
+                breaker.record_failure()
+            response = None
+            attempts.append(_attempt_record(attempt, started, error=e))
+            if not _should_retry(policy, budget, attempt):
+                return None, attempts
+        except BaseException:
+            # Cancelled or interrupted mid-request: says nothing about the API, but free the probe slot
+            breaker.release_probe()
+            raise
+        else:
+            limiter.record_response(response.status_code, response.headers.get("Retry-After"))
+            breaker.record_status(response.status_code)
+            attempts.append(_attempt_record(attempt, started, status=response.status_code))
+            if response.status_code == 200 or not _should_retry(policy, budget, attempt, response.status_code):
+                return response, attempts
+
+        time.sleep(_backoff_before(policy, attempt, deadline))
+
+
+async def apost_completion(client, headers, data, retry_policy=None, budget=None, deadline=None):
+    """Async version of post_completion on a caller-owned httpx.AsyncClient"""
+    policy = retry_policy or default_retry_policy
+    limiter = get_rate_limiter()
+    breaker = get_circuit_breaker()
+    response = None
+    attempts = []
+
+    for attempt in range(1, policy.max_attempts + 1):
+        # Fail fast while the API is known to be down or the deadline has passed
+        if not attempts:
+            if _deadline_passed(deadline):
+                raise DeadlineExceeded("deadline passed before the request was sent")
+            breaker.check()
+        elif _deadline_passed(deadline) or not breaker.allow_request():
+            return response, attempts
+
+        await limiter.aacquire()
+        connect_timeout, read_timeout = policy.timeouts(deadline)
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        started = time.perf_counter()
+        try:
+            response = await client.post(api_url(), headers=headers, json=data, timeout=timeout)
+        except httpx.HTTPError as e:
+            if _cut_by_deadline(policy, (connect_timeout, read_timeout), e):
+                breaker.release_probe()
+            else:
+                limiter.record_error()
+                breaker.record_failure()
+            response = None
+            attempts.append(_attempt_record(attempt, started, error=e))
+            if not _should_retry(policy, budget, attempt):
+                return None, attempts
+        except BaseException:
+            # Cancelled or interrupted mid-request: says nothing about the API, but free the probe slot
+            breaker.release_probe()
+            raise
+        else:
+            limiter.record_response(response.status_code, response.headers.get("Retry-After"))
+            breaker.record_status(response.status_code)
+            attempts.append(_attempt_record(attempt, started, status=response.status_code))
+            if response.status_code == 200 or not _should_retry(policy, budget, attempt, response.status_code):
+                return response, attempts
+
+        await asyncio.sleep(_backoff_before(policy, attempt, deadline))
+
+
+def _backoff_before(policy, attempt, deadline):
+    """Backoff delay, never sleeping past the deadline"""
+    delay = policy.backoff(attempt)
+    if deadline is not None:
+        delay = min(delay, max(deadline - time.monotonic(), 0.0))
+    return delay
+
+
+# Token counters reported in the "usage" block of a DeepSeek completion
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "prompt_cache_hit_tokens", "prompt_cache_miss_tokens")
+
+
+def usage_from_result(result):
+    """Normalized token usage of one completion response body"""
+    usage = result.get("usage") or {}
+    return {field: int(usage.get(field) or 0) for field in USAGE_FIELDS}
+
+
+def completion_metadata(result):
+    """Model, finish reason and token counts of one completion response body"""
+    choices = result.get("choices") or [{}]
+    usage = usage_from_result(result)
+    return {
+        'model': result.get("model"),
+        'finish_reason': choices[0].get("finish_reason"),
+        'prompt_tokens': usage["prompt_tokens"],
+        'completion_tokens': usage["completion_tokens"]
+    }
+
+
+class UsageTotals:
+    """Thread-safe token usage totals for one generation run"""
+
+    def __init__(self):
+        self.requests = 0
+        self.totals = dict.fromkeys(USAGE_FIELDS, 0)
+        self._lock = threading.Lock()
+
+    def add(self, usage):
+        with self._lock:
+            self.requests += 1
+            for field in USAGE_FIELDS:
+                self.totals[field] += usage.get(field, 0)
+
+    def report(self):
+        """Totals plus the share of prompt tokens served from the provider's prefix cache"""
+        with self._lock:
+            report = dict(self.totals, requests=self.requests)
+        cached = report["prompt_cache_hit_tokens"]
+        prompt = cached + report["prompt_cache_miss_tokens"] or report["prompt_tokens"]
+        report["prefix_cache_hit_rate"] = round(cached / prompt, 3) if prompt else 0.0
+        return report
+
+
+def stream_completion(headers, data, retry_policy=None, deadline=None, attempts=None, result=None):
+    """Stream a chat completion, yielding content deltas as they arrive
+
+    Raises requests.RequestException on transport errors or a non-200
+    response, and CircuitOpenError while the API is known to be down.
+    Streams are not retried: tokens may already have been shown. deadline
+    (a time.monotonic() timestamp) shortens the connect and read timeouts.
+    The attempt record is appended to attempts, and result is filled like
+    a non-streamed response body (model, finish_reason, usage) when given.
+    """
+    policy = retry_policy or default_retry_policy
+    limiter = get_rate_limiter()
+    breaker = get_circuit_breaker()
+    breaker.check()
+    limiter.acquire()
+    timeout = policy.timeouts(deadline)
+    attempts = [] if attempts is None else attempts
+    started = time.perf_counter()
+    try:
+        response = get_session().post(
+            api_url(),
+            headers=headers,
+            # Token usage arrives in one extra chunk before [DONE]
+            json=dict(data, stream=True, stream_options={"include_usage": True}),
+            timeout=timeout,
+            stream=True
+        )
+    except requests.RequestException as e:
+        if _cut_by_deadline(policy, timeout, e):
+            breaker.release_probe()
+        else:
+            limiter.record_error()
+            breaker.record_failure()
+        attempts.append(_attempt_record(1, started, error=e))
+        raise
+    except BaseException:
+        breaker.release_probe()
+        raise
+    limiter.record_response(response.status_code, response.headers.get("Retry-After"))
+    breaker.record_status(response.status_code)
+    # Latency to the response headers; the stream itself may run much longer
+    attempts.append(_attempt_record(1, started, status=response.status_code))
+
+    with response:
+        response.raise_for_status()
+        response.encoding = "utf-8"
+        yield from iter_stream_deltas(response.iter_lines(decode_unicode=True), result)
+
+
+def iter_stream_deltas(lines, result=None):
+    """Yield content deltas from the SSE lines of a streaming completion
+
+    If a result dict is passed, the model, finish_reason and usage seen in
+    the chunks are collected into it in the shape of a non-streamed
+    response body, for completion_metadata and usage_from_result.
+    """
+    for line in lines:
+        chunk = parse_stream_chunk(line)
+        if chunk is None:
+            return
+        choices = chunk.get("choices") or []
+        if result is not None:
+            if chunk.get("model"):
+                result["model"] = chunk["model"]
+            if chunk.get("usage"):
+                result["usage"] = chunk["usage"]
+            if choices and choices[0].get("finish_reason"):
+                result["choices"] = [{"finish_reason": choices[0]["finish_reason"]}]
+        delta = choices[0].get("delta", {}).get("content") if choices else None
+        if delta:
+            yield delta
+
+
+def parse_stream_chunk(line):
+    """JSON chunk carried by one SSE line: {} if none, None at [DONE]"""
+    if not line or not line.startswith("data:"):
+        return {}
+    chunk = line[len("data:"):].strip()
+    if chunk == "[DONE]":
+        return None
+    return json.loads(chunk)
+
+
+def _attempt_record(attempt, started, status=None, error=None):
+    """Describe one attempt and count it in the upstream metrics"""
+    latency = time.perf_counter() - started
+    observe_upstream_attempt(attempt, status, latency, error)
+    return {
+        'attempt': attempt,
+        'status': status,
+        'latency': round(latency, 3),
+        'error': f"{type(error).__name__}: {error}" if error else None
+    }
@@ -0,0 +1,174 @@
+# Server-Sent Events push of Output/ changes to open dashboards
+# One asyncio loop on its own port holds every connection, so idle clients cost a socket, not a thread
+import os
+import json
+import asyncio
+import threading
+from output_index import get_output_index
+
+RESPONSE_HEADERS = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"Connection: keep-alive\r\n"
+    b"X-Accel-Buffering: no\r\n"
+    # The dashboard is served from another port, so EventSource connects cross-origin
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"\r\n"
+    b"retry: 3000\n\n"
+)
+NOT_FOUND = b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+# Events queued for a client that isn't reading; past this it is dropped and reconnects
+_CLIENT_QUEUE_SIZE = 16
+_HEADER_TIMEOUT = 10.0
+
+
+def format_event(event, data):
+    """One SSE frame; data is JSON text or a JSON-serializable value"""
+    if not isinstance(data, (str, bytes)):
+        data = json.dumps(data)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + data + b"\n\n"
+
+
+class FileEventHub:
+    """Pushes 'files' (the /files listing) and 'run_complete' events to subscribers
+
+    The listing is pushed when a client connects and whenever the Output/
+    index changes: right away when a run in this process calls publish(),
+    and within watch_interval for files written by other processes (the
+    scheduler). The folder is only checked while someone is connected.
+    """
+
+    def __init__(self, folder="Output", host="0.0.0.0", port=5001, watch_interval=1.0, heartbeat=25.0):
+        self.index = get_output_index(folder)
+        self.host = host
+        self.port = port
+        self.watch_interval = watch_interval
+        self.heartbeat = heartbeat
+        self._clients = set()
+        self._loop = None
+        self._server = None
+        self._last_etag = None
+        self._thread = None
+
+    def start(self):
+        """Serve on a background thread; returns False if push is off or the port can't be bound"""
+        if not self.port:
+            return False
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._server = self._loop.run_until_complete(
+                    asyncio.start_server(self._handle, self.host, self.port))
+            except OSError as e:
+                errors.append(e)
+                ready.set()
+                return
+            self._loop.create_task(self._watch())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="file-events", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            print(f"[WARN] File events server not started on port {self.port}: {errors[0]}")
+            return False
+        self.port = self._server.sockets[0].getsockname()[1]
+        return True
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    def publish(self, event, data=None):
+        """Send an event to every client and push the listing if it changed; safe from any thread"""
+        if not self.running:
+            return
+        frame = format_event(event, data if data is not None else {})
+        self._loop.call_soon_threadsafe(self._broadcast, frame)
+        self._loop.call_soon_threadsafe(self._check_files)
+
+    def stats(self):
+        return {'running': self.running, 'port': self.port, 'clients': len(self._clients)}
+
+    def _broadcast(self, frame):
+        for queue in list(self._clients):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Too far behind: end its stream; EventSource reconnects and gets a fresh listing
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                self._clients.discard(queue)
+
+    def _check_files(self):
+        if not self._clients:
+            return
+        snapshot = self.index.snapshot()
+        if snapshot.etag != self._last_etag:
+            self._last_etag = snapshot.etag
+            self._broadcast(format_event("files", snapshot.body))
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            self._check_files()
+
+    async def _handle(self, reader, writer):
+        queue = None
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), _HEADER_TIMEOUT)
+            method, _, rest = request.partition(b" ")
+            path = rest.split(b" ", 1)[0].split(b"?", 1)[0]
+            if method != b"GET" or path != b"/events":
+                writer.write(NOT_FOUND)
+                await writer.drain()
+                return
+
+            queue = asyncio.Queue(_CLIENT_QUEUE_SIZE)
+            writer.write(RESPONSE_HEADERS + format_event("files", self.index.snapshot().body))
+            await writer.drain()
+            self._clients.add(queue)
+
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Comment line: keeps proxies from closing an idle stream and detects dead clients
+                    frame = b": keep-alive\n\n"
+                if frame is None:
+                    return
+                writer.write(frame)
+                await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            if queue is not None:
+                self._clients.discard(queue)
+            writer.close()
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_file_event_hub():
+    """Return the process-wide hub; EVENTS_PORT sets its port (0 turns push off)"""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = FileEventHub(
+                    port=int(os.getenv("EVENTS_PORT", "5001")),
+                    watch_interval=float(os.getenv("EVENTS_WATCH_INTERVAL", "1.0"))
+                )
+    return _hub
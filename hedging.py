@@ -0,0 +1,156 @@
+# Hedged requests for DeepSeek completions
+# If a request is slower than a recent-latency percentile, race a duplicate and keep the first answer
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class LatencyTracker:
+    """Sliding window of recent successful request latencies"""
+
+    def __init__(self, window=200, min_samples=5):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """Latency at the given percentile, or None until enough samples exist"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+_latency_tracker = LatencyTracker()
+
+
+def get_latency_tracker():
+    """Process-wide tracker, so hedge delays survive across generator instances"""
+    return _latency_tracker
+
+
+class Hedger:
+    """Sends a backup request when the first one outlives the hedge delay
+
+    The hedge delay is the given percentile of recent latencies. Whichever
+    request returns content first wins; a losing thread is ignored and a
+    losing task is cancelled. fired/won counters show what hedging costs
+    (extra requests) against what it saves (hedges that beat the original).
+    """
+
+    def __init__(self, percentile=95, tracker=None, max_workers=16):
+        self.percentile = percentile
+        self.tracker = tracker or get_latency_tracker()
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls = 0
+            self.fired = 0
+            self.won = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'percentile': self.percentile,
+                'hedge_delay': self.hedge_delay(),
+                'calls': self.calls,
+                'fired': self.fired,
+                'won': self.won
+            }
+
+    def hedge_delay(self):
+        return self.tracker.percentile(self.percentile)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hedge")
+            return self._executor
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        if result is not None:
+            self.tracker.record(time.perf_counter() - started)
+        return result
+
+    async def _atimed(self, fn, *args):
+        started = time.perf_counter()
+        result = await fn(*args)
+        if result is not None:
+            self.tracker.record(time.perf_counter() - started)
+        return result
+
+    def call(self, fn, *args):
+        """Run fn(*args) with hedging; fn returns None on failure"""
+        self._count('calls')
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._timed(fn, *args)
+
+        executor = self._get_executor()
+        primary = executor.submit(self._timed, fn, *args)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = executor.submit(self._timed, fn, *args)
+        self._count('fired')
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result is not None:
+                    if future is hedge:
+                        self._count('won')
+                    for loser in pending:
+                        loser.cancel()
+                    return result
+        return None
+
+    async def acall(self, fn, *args):
+        """Async version of call for coroutine functions"""
+        self._count('calls')
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._atimed(fn, *args)
+
+        primary = asyncio.ensure_future(self._atimed(fn, *args))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = asyncio.ensure_future(self._atimed(fn, *args))
+        self._count('fired')
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        if task is hedge:
+                            self._count('won')
+                        return result
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
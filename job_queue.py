@@ -0,0 +1,271 @@
+# Background generation jobs for the web apps
+# POST /generate enqueues a job and returns its id; a bounded worker pool runs it and /jobs/<id> reports progress
+import os
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+
+class QueueFullError(Exception):
+    """Raised when max_pending jobs are already queued or running"""
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+class Job:
+    """One generation run: status, per-post progress, result or error
+
+    The worker reports through set_total(), token(), post_done() and the
+    return value of the job function; readers use to_dict() or wait for
+    new events with events_since() or follow().
+    """
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.total = None
+        self.posts = {}
+        self.result = None
+        self.error = None
+        self._events = []
+        self._changed = threading.Condition()
+
+    def _emit(self, event, data):
+        with self._changed:
+            self._events.append((event, data))
+            self._changed.notify_all()
+
+    def start(self):
+        self.status = RUNNING
+        self.started_at = time.time()
+        self._emit('status', self.to_dict(include_posts=False))
+
+    def set_total(self, total):
+        """Number of posts the run will produce"""
+        self.total = total
+        self._emit('status', self.to_dict(include_posts=False))
+
+    def token(self, number, text):
+        """Record a content delta of a post that is still streaming"""
+        self._emit('token', {'number': number, 'text': text})
+
+    def post_done(self, post):
+        """Record a finished post; a later post with the same number (a regeneration) replaces it"""
+        self.posts[post['number']] = post
+        self._emit('post', post)
+
+    def finish(self, result):
+        self.result = result
+        self.status = SUCCEEDED
+        self.finished_at = time.time()
+        self._emit('complete', self.to_dict())
+
+    def fail(self, error):
+        self.error = error
+        self.status = FAILED
+        self.finished_at = time.time()
+        self._emit('complete', self.to_dict())
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def events_since(self, cursor, timeout=None):
+        """(events after cursor, new cursor); waits up to timeout for one if there are none yet"""
+        with self._changed:
+            if cursor >= len(self._events):
+                self._changed.wait(timeout)
+            return self._events[cursor:], len(self._events)
+
+    def follow(self, keepalive=15):
+        """Yield every event from the first until 'complete'; (None, None) after keepalive idle seconds
+
+        Replays everything so far, so a late subscriber still sees every post.
+        """
+        cursor = 0
+        while True:
+            batch, cursor = self.events_since(cursor, timeout=keepalive)
+            if not batch:
+                yield None, None
+            for event, data in batch:
+                yield event, data
+                if event == 'complete':
+                    return
+
+    def to_dict(self, include_posts=True):
+        finished_at = self.finished_at or time.time()
+        posts_done = len(self.posts)
+        job = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': _timestamp(self.created_at),
+            'started_at': _timestamp(self.started_at),
+            'finished_at': _timestamp(self.finished_at),
+            'duration': round(finished_at - self.started_at, 3) if self.started_at else None,
+            'progress': {'posts_done': posts_done, 'posts_total': self.total},
+            'error': self.error
+        }
+        if include_posts:
+            posts = self.posts.copy()
+            job['posts'] = [posts[i] for i in sorted(posts)]
+            job['result'] = self.result
+        return job
+
+
+class JobQueue:
+    """Runs jobs on a fixed pool of worker threads
+
+    At most max_pending jobs may be queued or running; submit() raises
+    QueueFullError beyond that so callers can answer 429 instead of
+    piling up work. The newest `retention` finished jobs stay queryable.
+    """
+
+    def __init__(self, max_workers=2, max_pending=10, retention=100):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn):
+        """Queue fn(job) and return the Job; fn's return value becomes job.result"""
+        job = Job(kind)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"{self._pending} jobs already queued or running")
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._evict()
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        job.start()
+        try:
+            job.finish(fn(job))
+        except Exception as e:
+            job.fail(str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, limit=20):
+        """Most recent jobs first"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))[:limit]
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {'workers': self.max_workers, 'max_pending': self.max_pending, 'pending': self._pending,
+                    **{status: statuses.count(status) for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue, configured from the environment"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(
+                    max_workers=int(os.getenv("JOB_WORKERS", "2")),
+                    max_pending=int(os.getenv("JOB_QUEUE_SIZE", "10")),
+                    retention=int(os.getenv("JOB_RETENTION", "100"))
+                )
+    return _queue
+
+
+def enqueue_response(kind, fn):
+    """Flask response for a POST that starts a job: 202 with the job id, or 429 if the queue is full"""
+    from flask import jsonify
+
+    try:
+        job = get_job_queue().submit(kind, fn)
+    except QueueFullError as e:
+        response = jsonify({'success': False, 'error': f"Too many generation jobs: {e}"})
+        response.status_code = 429
+        response.headers['Retry-After'] = '30'
+        return response
+
+    response = jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f"/jobs/{job.id}",
+        'stream_url': f"/jobs/{job.id}/stream"
+    })
+    response.status_code = 202
+    response.headers['Location'] = f"/jobs/{job.id}"
+    return response
+
+
+def register_job_routes(app):
+    """Add /jobs, /jobs/<id> and /jobs/<id>/stream to a Flask app"""
+    from flask import Response, jsonify, request
+
+    @app.route('/jobs')
+    def list_jobs():
+        """Recent jobs (?limit=N) and queue counts"""
+        queue = get_job_queue()
+        limit = request.args.get('limit', default=20, type=int)
+        return jsonify({'jobs': [job.to_dict(include_posts=False) for job in queue.jobs(limit)],
+                        'queue': queue.stats()})
+
+    @app.route('/jobs/<job_id>')
+    def get_job(job_id):
+        """Status, per-post progress, result and error of one job"""
+        job = get_job_queue().get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/jobs/<job_id>/stream')
+    def stream_job(job_id):
+        """Job progress as Server-Sent Events: status, token (streamed runs), post (one per finished post), complete"""
+        job = get_job_queue().get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+
+        def events():
+            for event, data in job.follow():
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+        return Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    return app
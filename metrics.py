@@ -0,0 +1,213 @@
+# In-process Prometheus metrics
+# Thread-safe counters and histograms rendered in the text exposition format at /metrics
+import time
+import threading
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers fast routes up to a slow DeepSeek completion
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Seconds; whole generation runs
+RUN_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, one series per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # An unlabelled counter is exported as 0 before its first increment
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them for /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """Process-wide registry shared by the generators and the web apps"""
+    return _registry
+
+
+# Web routes
+http_requests = _registry.counter(
+    "http_requests_total", "HTTP requests handled, by app, route, method and status",
+    ("app", "route", "method", "status"))
+http_request_duration = _registry.histogram(
+    "http_request_duration_seconds", "Time to produce an HTTP response, by app and route",
+    ("app", "route"))
+
+# Generation runs
+generation_runs = _registry.histogram(
+    "generation_run_duration_seconds", "Duration of a full post generation run, by generator and mode",
+    ("generator", "mode"), buckets=RUN_BUCKETS)
+posts_generated = _registry.counter(
+    "posts_generated_total", "Posts produced, by source (api or backup fallback)",
+    ("generator", "source"))
+pdf_render_duration = _registry.histogram(
+    "pdf_render_duration_seconds", "Time to build the daily PDF")
+
+# DeepSeek upstream
+upstream_requests = _registry.counter(
+    "deepseek_requests_total", "DeepSeek API attempts, by HTTP status (error = no response)",
+    ("status",))
+upstream_duration = _registry.histogram(
+    "deepseek_request_duration_seconds", "Latency of one DeepSeek API attempt")
+upstream_errors = _registry.counter(
+    "deepseek_errors_total", "DeepSeek attempts that failed, by kind (http or transport)",
+    ("kind",))
+upstream_retries = _registry.counter(
+    "deepseek_retries_total", "DeepSeek attempts that were retries of an earlier attempt")
+upstream_rate_limited = _registry.counter(
+    "deepseek_rate_limited_total", "DeepSeek responses with status 429")
+
+
+def observe_upstream_attempt(attempt, status, latency, error=None):
+    """Record one DeepSeek API attempt"""
+    upstream_requests.inc(status=status if status is not None else "error")
+    upstream_duration.observe(latency)
+    if attempt > 1:
+        upstream_retries.inc()
+    if status == 429:
+        upstream_rate_limited.inc()
+    if error is not None:
+        upstream_errors.inc(kind="transport")
+    elif status is not None and status >= 400:
+        upstream_errors.inc(kind="http")
+
+
+def instrument_app(app, app_name):
+    """Count and time every request to a Flask app and serve /metrics
+
+    Streaming responses are timed until the response object is returned,
+    not until the stream ends.
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("metrics_started", None)
+        # Label by URL rule, not path, so /view/<filename> stays one series
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        http_requests.inc(app=app_name, route=route, method=request.method, status=response.status_code)
+        if started is not None:
+            http_request_duration.observe(time.perf_counter() - started, app=app_name, route=route)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus metrics in the text exposition format"""
+        return Response(_registry.render(), content_type=CONTENT_TYPE)
+
+    return app
@@ -0,0 +1,346 @@
+# Local stand-in for the DeepSeek chat completions endpoint
+# Offline benchmarking and testing: configurable latency, injected errors/429s and streaming, no tokens spent
+#
+# Usage:
+#   python mock_deepseek_server.py --port 8001 --latency lognormal --latency-mean 1.5
+#   set DEEPSEEK_BASE_URL=http://127.0.0.1:8001/v1   (then run the generator or a web interface)
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import itertools
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+LATENCY_MODELS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+SAMPLE_WORDS = (
+    "Your stop loss is not the problem. Your position size is. Most traders lose because "
+    "they trade too big, too often, on too little information. Cut the size, keep the rules, "
+    "and let the edge play out over hundreds of trades instead of hoping one trade saves the month."
+).split()
+
+
+class MockConfig:
+    """Behaviour of the mock server; every field can be changed while it runs"""
+
+    def __init__(self, latency="fixed", latency_mean=0.0, latency_jitter=0.0,
+                 error_rate=0.0, error_statuses=(500, 502, 503),
+                 rate_limit_rate=0.0, retry_after=1.0,
+                 token_delay=0.02, completion_words=40, model="deepseek-chat", seed=None):
+        if latency not in LATENCY_MODELS:
+            raise ValueError(f"latency must be one of {', '.join(LATENCY_MODELS)}")
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.token_delay = token_delay
+        self.completion_words = completion_words
+        self.model = model
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_latency(self):
+        """Seconds to wait before answering, drawn from the latency model"""
+        mean, jitter = self.latency_mean, self.latency_jitter
+        with self._lock:
+            if self.latency == "uniform":
+                delay = self.random.uniform(mean - jitter, mean + jitter)
+            elif self.latency == "normal":
+                delay = self.random.gauss(mean, jitter)
+            elif self.latency == "lognormal":
+                # jitter is the sigma of the underlying normal; mean is the median latency
+                delay = mean * self.random.lognormvariate(0, jitter or 0.5) if mean > 0 else 0.0
+            elif self.latency == "exponential":
+                delay = self.random.expovariate(1 / mean) if mean > 0 else 0.0
+            else:
+                delay = mean
+        return max(delay, 0.0)
+
+    def pick_failure(self):
+        """(status, headers) for an injected failure, or None to answer normally"""
+        with self._lock:
+            roll = self.random.random()
+            if roll < self.rate_limit_rate:
+                return 429, {"Retry-After": f"{self.retry_after:g}"}
+            if roll < self.rate_limit_rate + self.error_rate:
+                return self.random.choice(self.error_statuses), {}
+        return None
+
+    def words(self, count):
+        """Random sample words, so posts aren't near-duplicates of each other"""
+        with self._lock:
+            return self.random.choices(SAMPLE_WORDS, k=count)
+
+
+class MockStats:
+    """Request counters exposed at GET /stats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.streamed = 0
+            self.rate_limited = 0
+            self.errors = 0
+            self.in_flight = 0
+            self.max_in_flight = 0
+
+    def count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'streamed': self.streamed,
+                'rate_limited': self.rate_limited,
+                'errors': self.errors,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight
+            }
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY each
+    # keep-alive response waits on the client's delayed ACK (~40ms)
+    disable_nagle_algorithm = True
+    _ids = itertools.count(1)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self.send_json(200, self.server.stats.snapshot())
+        else:
+            self.send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "not found"}})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError:
+            self.send_json(400, {"error": {"message": "invalid JSON body"}})
+            return
+
+        config, stats = self.server.config, self.server.stats
+        stats.count('requests')
+        stats.count('in_flight')
+        try:
+            time.sleep(config.sample_latency())
+
+            failure = config.pick_failure()
+            if failure:
+                status, headers = failure
+                stats.count('rate_limited' if status == 429 else 'errors')
+                self.send_json(status, {"error": {"message": f"mock injected {status}"}}, headers)
+                return
+
+            if body.get("stream"):
+                stats.count('streamed')
+                self.stream_completion(body)
+            else:
+                self.send_json(200, self.build_completion(body))
+        finally:
+            stats.count('in_flight', -1)
+
+    def build_completion(self, body):
+        config = self.server.config
+        choices = []
+        for index in range(int(body.get("n") or 1)):
+            content = self.completion_text(body)
+            choices.append({
+                "index": index,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            })
+
+        return {
+            "id": f"mock-{next(self._ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or config.model,
+            "choices": choices,
+            "usage": self.build_usage(body, sum(estimate_tokens(c["message"]["content"]) for c in choices))
+        }
+
+    def build_usage(self, body, completion_tokens):
+        messages = body.get("messages") or []
+        prompt_text = "".join(str(m.get("content", "")) for m in messages)
+        system_text = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        prompt_tokens = estimate_tokens(prompt_text)
+        # The shared system prompt is what DeepSeek's prefix cache would serve
+        cache_hit = min(estimate_tokens(system_text) // 64 * 64, prompt_tokens)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_cache_hit_tokens": cache_hit,
+            "prompt_cache_miss_tokens": prompt_tokens - cache_hit
+        }
+
+    def completion_text(self, body):
+        """Post text, or a {"posts": [...]} object when JSON output was requested"""
+        config = self.server.config
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            user = next((m.get("content", "") for m in reversed(body.get("messages") or [])
+                         if m.get("role") == "user"), "")
+            formats = sorted({int(n) for n in re.findall(r"FORMAT (\d+):", user)}) or [1]
+            posts = [{"format": n, "content": " ".join(config.words(config.completion_words))}
+                     for n in formats]
+            return json.dumps({"posts": posts})
+        return " ".join(config.words(config.completion_words))
+
+    def stream_completion(self, body):
+        config = self.server.config
+        completion_id = f"mock-{next(self._ids)}"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        model = body.get("model") or config.model
+        try:
+            words = config.words(config.completion_words)
+            for i, word in enumerate(words):
+                chunk = {
+                    "id": completion_id,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                                 "finish_reason": None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(config.token_delay)
+            final = {"id": completion_id, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            self.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage = {"id": completion_id, "model": model, "choices": [],
+                         "usage": self.build_usage(body, estimate_tokens(" ".join(words)))}
+                self.wfile.write(f"data: {json.dumps(usage)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away mid-stream
+            pass
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockDeepSeekServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config=None, verbose=False):
+        super().__init__(address, MockHandler)
+        self.config = config or MockConfig()
+        self.stats = MockStats()
+        self.verbose = verbose
+
+    def handle_error(self, request, client_address):
+        # Clients closing idle keep-alive connections is normal, not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_mock_server(host="127.0.0.1", port=0, verbose=False, **config):
+    """Start a mock server on a background thread and return it
+
+    port=0 picks a free port. Point the generators at it with
+    os.environ["DEEPSEEK_BASE_URL"] = server.base_url and call
+    server.shutdown() when done.
+    """
+    server = MockDeepSeekServer((host, port), MockConfig(**config), verbose=verbose)
+    thread = threading.Thread(target=server.serve_forever, name="mock-deepseek", daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the DeepSeek chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", choices=LATENCY_MODELS, default="fixed",
+                        help="latency distribution (default: fixed)")
+    parser.add_argument("--latency-mean", type=float, default=0.0,
+                        help="mean (median for lognormal) response latency in seconds")
+    parser.add_argument("--latency-jitter", type=float, default=0.0,
+                        help="spread: half-width for uniform, stddev for normal, sigma for lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of requests answered with a 5xx error")
+    parser.add_argument("--error-statuses", default="500,502,503",
+                        help="comma-separated statuses used for injected errors")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0,
+                        help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--token-delay", type=float, default=0.02,
+                        help="seconds between streamed tokens")
+    parser.add_argument("--completion-words", type=int, default=40,
+                        help="words per generated post")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(",") if s.strip()],
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        token_delay=args.token_delay,
+        completion_words=args.completion_words,
+        seed=args.seed
+    )
+    server = MockDeepSeekServer((args.host, args.port), config, verbose=args.verbose)
+
+    print(f"[OK] Mock DeepSeek API listening on {server.base_url}")
+    print(f"Set DEEPSEEK_BASE_URL={server.base_url} to use it")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nMock server stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Cached listing of the generated files in Output/ for the /files route
+# Rebuilt only when the directory changes; the serialized body and its ETag are cached with it
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Directory mtimes this close to the build time may hide a later change in the same tick (coarse
+# filesystem timestamps), so such an index is rebuilt on the next request
+_RACY_SECONDS = 2.0
+
+
+class Snapshot:
+    """One build of the index: file list, JSON body, ETag and Last-Modified"""
+
+    def __init__(self, files, modified):
+        self.files = files
+        self.body = json.dumps({'files': files}).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.last_modified = datetime.fromtimestamp(modified, tz=timezone.utc) if modified else None
+
+
+class OutputIndex:
+    """Index of the Twitter_Posts_*.pdf runs in a folder
+
+    Every lookup costs one stat() of the folder; the folder is only listed
+    again when its mtime (or inode) changes, i.e. when a file is added,
+    removed or replaced.
+    """
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self._version = None
+        self._built_at = 0.0
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def _folder_version(self):
+        try:
+            stat = self.folder.stat()
+        except FileNotFoundError:
+            return None, None
+        return (stat.st_mtime_ns, stat.st_ino), stat.st_mtime
+
+    def snapshot(self):
+        """Current Snapshot, rebuilt only if the folder changed since the last build"""
+        version, modified = self._folder_version()
+        with self._lock:
+            racy = modified is not None and self._built_at - modified < _RACY_SECONDS
+            if self._snapshot is not None and version == self._version and not racy:
+                return self._snapshot
+
+            built_at = time.time()
+            self._snapshot = Snapshot(self._list_files() if version else [], modified)
+            self._version = version
+            self._built_at = built_at
+            self.builds += 1
+            return self._snapshot
+
+    def _list_files(self):
+        names = {path.name for path in self.folder.iterdir()}
+        files = []
+        for name in sorted((n for n in names if n.startswith('Twitter_Posts_') and n.endswith('.pdf')),
+                           reverse=True):
+            stem = name[:-len('.pdf')]
+            txt_name = f"{stem}.txt"
+            date_str = stem.split('_')[-1]
+
+            # Format date
+            try:
+                formatted_date = datetime.strptime(date_str, '%Y%m%d').strftime('%B %d, %Y')
+            except ValueError:
+                formatted_date = date_str
+
+            files.append({
+                'name': name,
+                'date': formatted_date,
+                'pdf_path': name,
+                'txt_path': txt_name if txt_name in names else None
+            })
+        return files
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_output_index(folder='Output'):
+    """Return the process-wide index of folder"""
+    key = str(Path(folder).resolve())
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(key, OutputIndex(folder))
+    return index
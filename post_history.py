@@ -0,0 +1,227 @@
+# Searchable history of every generated post
+# SQLite (WAL) table indexed by date and format, with an FTS5 index over post content for /search
+import os
+import re
+import sys
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from pathlib import Path
+from post_store import read_posts, parse_text_posts
+
+MAX_PER_PAGE = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history_posts (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT,
+    run_date TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    backup INTEGER NOT NULL DEFAULT 0,
+    truncated INTEGER NOT NULL DEFAULT 0,
+    model TEXT
+);
+CREATE INDEX IF NOT EXISTS history_posts_date ON history_posts (run_date);
+CREATE INDEX IF NOT EXISTS history_posts_format ON history_posts (number, run_date);
+
+-- External-content FTS5 index: the text lives once, in history_posts
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    content, content='history_posts', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS history_posts_ai AFTER INSERT ON history_posts BEGIN
+    INSERT INTO history_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS history_posts_ad AFTER DELETE ON history_posts BEGIN
+    INSERT INTO history_fts (history_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+_TERM = re.compile(r"\w+\*?")
+_FILE_DATE = re.compile(r"Twitter_Posts_(\d{8})$")
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, 'word*' matches a prefix
+
+    Words are quoted, so FTS5 operators and stray punctuation in user input
+    can't cause syntax errors.
+    """
+    terms = []
+    for term in _TERM.findall(text):
+        prefix = term.endswith("*")
+        word = term.rstrip("*")
+        terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " ".join(terms)
+
+
+class PostHistory:
+    """Every post of every run, searchable by content, date and format
+
+    Lookups by date or format use ordinary indexes; full-text queries use
+    the FTS5 index, so search stays in milliseconds however many years of
+    daily runs are stored.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def add_run(self, posts, run_id=None, run_date=None):
+        """Store the posts of one run in a single transaction; returns how many were stored"""
+        now = datetime.now()
+        run_date = run_date or now.strftime("%Y-%m-%d")
+        rows = [
+            (run_id, run_date, post['number'], post['content'], now.strftime("%Y-%m-%d %H:%M:%S"),
+             int(bool(post.get('backup'))), int(bool(post.get('truncated'))), post.get('model'))
+            for post in posts
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO history_posts (run_id, run_date, number, content, created_at, backup, truncated, model) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def has_date(self, run_date):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM history_posts WHERE run_date = ? LIMIT 1", (run_date,)
+            ).fetchone()
+        return row is not None
+
+    def search(self, query, page=1, per_page=20, number=None, since=None, until=None, sort="newest"):
+        """One page of posts matching query
+
+        number limits results to one format; since/until (YYYY-MM-DD,
+        inclusive) to a date range. sort is "newest" (most recently stored
+        first, the default) or "relevance" (BM25, which has to score every
+        match, so it is slower for words found in most posts). Returns
+        {'query', 'total', 'page', 'per_page', 'results'}; each result has a
+        highlighted 'snippet'.
+        """
+        page = max(page, 1)
+        per_page = min(max(per_page, 1), MAX_PER_PAGE)
+        match = fts_query(query)
+        response = {'query': query, 'total': 0, 'page': page, 'per_page': per_page, 'results': []}
+        if not match:
+            return response
+
+        filters = []
+        params = []
+        if number is not None:
+            filters.append("p.number = ?")
+            params.append(number)
+        if since:
+            filters.append("p.run_date >= ?")
+            params.append(since)
+        if until:
+            filters.append("p.run_date <= ?")
+            params.append(until)
+        order = "bm25(history_fts)" if sort == "relevance" else "history_fts.rowid DESC"
+
+        with self._lock:
+            if filters:
+                # Match once into a rowid set, then probe it from the date/format indexes
+                response['total'] = self._conn.execute(
+                    f"SELECT COUNT(*) FROM history_posts p WHERE {' AND '.join(filters)} "
+                    "AND p.id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)",
+                    params + [match]
+                ).fetchone()[0]
+            else:
+                response['total'] = self._conn.execute(
+                    "SELECT COUNT(*) FROM history_fts WHERE history_fts MATCH ?", (match,)
+                ).fetchone()[0]
+
+            # Driven by the full-text index in rowid order, so a page stops after LIMIT rows
+            rows = self._conn.execute(
+                "SELECT p.id, p.run_date, p.number, p.content, p.backup, "
+                "snippet(history_fts, 0, '<mark>', '</mark>', '...', 16) "
+                "FROM history_fts JOIN history_posts p ON p.id = history_fts.rowid "
+                f"WHERE {' AND '.join(['history_fts MATCH ?'] + filters)} "
+                f"ORDER BY {order} LIMIT ? OFFSET ?",
+                [match] + params + [per_page, (page - 1) * per_page]
+            ).fetchall()
+
+        response['results'] = [
+            {'id': post_id, 'date': run_date, 'number': number, 'content': content,
+             'backup': bool(backup), 'snippet': snippet}
+            for post_id, run_date, number, content, backup, snippet in rows
+        ]
+        return response
+
+    def backfill(self, folder):
+        """Import runs from Output/ files whose date isn't in the history yet; returns posts added"""
+        folder = Path(folder)
+        added = 0
+        stems = {path.stem for path in folder.glob("Twitter_Posts_*.txt")}
+        stems.update(path.stem for path in folder.glob("Twitter_Posts_*.jsonl"))
+        for stem in sorted(stems):
+            date_match = _FILE_DATE.match(stem)
+            if not date_match:
+                continue
+            run_date = datetime.strptime(date_match.group(1), "%Y%m%d").strftime("%Y-%m-%d")
+            if self.has_date(run_date):
+                continue
+            jsonl = folder / f"{stem}.jsonl"
+            if jsonl.exists():
+                posts = read_posts(jsonl)
+            else:
+                posts = parse_text_posts((folder / f"{stem}.txt").read_text(encoding="utf-8"))
+            added += self.add_run(posts, run_date=run_date)
+        return added
+
+    def stats(self):
+        with self._lock:
+            posts, runs = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT run_date) FROM history_posts"
+            ).fetchone()
+        return {'posts': posts, 'days': runs}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_post_history():
+    """Return the process-wide post history, stored at POST_HISTORY_PATH"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = PostHistory(os.getenv("POST_HISTORY_PATH", "Output/post_history.db"))
+    return _history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post history: import earlier runs or search from the command line")
+    parser.add_argument("--backfill", metavar="FOLDER", help="import Twitter_Posts_* files from FOLDER (e.g. Output)")
+    parser.add_argument("--search", metavar="QUERY", help="print posts matching QUERY")
+    parser.add_argument("--limit", type=int, default=10, help="search results to print (default: 10)")
+    args = parser.parse_args()
+
+    history = get_post_history()
+    if args.backfill:
+        print(f"[OK] Imported {history.backfill(args.backfill)} posts from {args.backfill}")
+    if args.search:
+        found = history.search(args.search, per_page=args.limit)
+        print(f"{found['total']} posts match '{args.search}'")
+        for result in found['results']:
+            print(f"\n{result['date']} #{result['number']}\n{result['content']}")
+    if not args.backfill and not args.search:
+        parser.print_help(sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
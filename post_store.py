@@ -0,0 +1,131 @@
+# Structured per-run post files and a parsed-file cache for /view
+# Each run writes Twitter_Posts_YYYYMMDD.jsonl next to the PDF/TXT: one JSON record per post
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# Fields written to each JSONL record, when the post has them
+RECORD_FIELDS = ('number', 'content', 'timestamp', 'backup', 'truncated', 'regenerated',
+                 'near_duplicate', 'model', 'finish_reason')
+
+_SEPARATOR = "-" * 60
+_NUMBER_PREFIX = re.compile(r"^(\d+)\.\s*")
+
+
+def sidecar_path(path):
+    """The JSONL file that goes with a run's .txt or .pdf"""
+    return Path(path).with_suffix('.jsonl')
+
+
+def write_posts(path, posts):
+    """Write one JSON record per post, replacing the file atomically"""
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for post in posts:
+            record = {field: post[field] for field in RECORD_FIELDS if field in post}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+    return path
+
+
+def read_posts(path):
+    """Records of a JSONL post file, skipping blank or corrupt lines"""
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and isinstance(record.get('content'), str):
+                records.append(record)
+    return records
+
+
+def parse_text_posts(text):
+    """Records from a .txt backup written before sidecars existed
+
+    Posts are delimited by the dashed separator lines, so a post body with
+    a line starting with a number and a period stays in one piece.
+    """
+    _, _, body = text.partition("=" * 60)
+    records = []
+    for chunk in body.split(_SEPARATOR):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        match = _NUMBER_PREFIX.match(chunk)
+        number = int(match.group(1)) if match else len(records) + 1
+        records.append({'number': number, 'content': chunk[match.end():] if match else chunk})
+    return records
+
+
+class PostFileCache:
+    """Parsed post files keyed on path and modification time
+
+    A file is parsed once per change; repeat reads return the cached
+    records without touching anything but stat(). Up to max_entries files
+    are kept, least recently used first out.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path):
+        """Records of a .jsonl file, or of a legacy .txt when it has no sidecar"""
+        path = Path(path)
+        if path.suffix != '.jsonl' and sidecar_path(path).exists():
+            path = sidecar_path(path)
+
+        stat = path.stat()
+        # The inode changes too when write_posts replaces the file
+        version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        key = str(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        if path.suffix == '.jsonl':
+            records = read_posts(path)
+        else:
+            records = parse_text_posts(path.read_text(encoding='utf-8'))
+
+        with self._lock:
+            self._entries[key] = (version, records)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return records
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_post_file_cache():
+    """Return the process-wide parsed-file cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PostFileCache(int(os.getenv("POST_FILE_CACHE_SIZE", "64")))
+    return _cache
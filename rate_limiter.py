@@ -0,0 +1,130 @@
+# Adaptive token-bucket rate limiter for DeepSeek API calls
+# One limiter per process, shared by threaded and asyncio generation paths
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Status codes that mean "slow down" and may carry a Retry-After header
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds to wait"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RateLimiter:
+    """Token bucket whose refill rate adapts to what the API tells us
+
+    The rate is cut multiplicatively on 429/503 and transport errors and grows
+    back additively on successes (AIMD), never leaving [min_rate, max_rate].
+    A Retry-After header pauses every caller until it expires.
+    """
+
+    def __init__(self, rate=5.0, burst=10, min_rate=0.5, max_rate=None,
+                 decrease_factor=0.5, increase_step=0.1):
+        self.rate = float(rate)
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate or float(rate)
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+        self.throttled = 0
+        self.errors = 0
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Take one token and return how long the caller must wait before sending"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self):
+        """Block the calling thread until a request may be sent"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        """Wait on the event loop until a request may be sent"""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record_response(self, status_code, retry_after=None):
+        """Adapt the rate to an API response (retry_after is the raw header value)"""
+        with self._lock:
+            if status_code in THROTTLE_STATUS_CODES:
+                self.throttled += 1
+                self._slow_down()
+                delay = parse_retry_after(retry_after)
+                if delay:
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            elif status_code < 400:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def record_error(self):
+        """Slow down after a timeout or connection failure"""
+        with self._lock:
+            self.errors += 1
+            self._slow_down()
+
+    def _slow_down(self):
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self._tokens = min(self._tokens, 0.0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate': round(self.rate, 3),
+                'max_rate': self.max_rate,
+                'burst': self.burst,
+                'throttled': self.throttled,
+                'errors': self.errors,
+                'blocked_for': round(max(self._blocked_until - time.monotonic(), 0.0), 3)
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Return the process-wide limiter, configured from the environment"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    rate=float(os.getenv("DEEPSEEK_RATE_LIMIT", "5")),
+                    burst=int(os.getenv("DEEPSEEK_RATE_BURST", "10"))
+                )
+    return _limiter
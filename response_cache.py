@@ -0,0 +1,178 @@
+# Content-addressed cache for DeepSeek completion responses
+# In-memory LRU tier in front of an on-disk tier, both with TTLs and size limits
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+def make_cache_key(data):
+    """Hash the request fields that determine a completion"""
+    messages = data.get("messages", [])
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    material = json.dumps({
+        "model": data.get("model"),
+        "system": system,
+        "user": user,
+        "temperature": data.get("temperature"),
+        "max_tokens": data.get("max_tokens"),
+        # Only present for best-of-N requests, so single-sample keys are unchanged
+        **({"n": data["n"]} if data.get("n", 1) > 1 else {})
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier TTL cache of completion response bodies
+
+    The memory tier keeps up to max_entries responses in LRU order. The disk
+    tier stores one JSON file per key under directory and drops the oldest
+    files once it grows past max_disk_bytes. If the directory can't be
+    written (e.g. a read-only serverless filesystem) only memory is used.
+    """
+
+    def __init__(self, directory=".deepseek_cache", ttl=24 * 3600, max_entries=256,
+                 max_disk_bytes=50 * 1024 * 1024):
+        self.directory = Path(directory) if directory else None
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached response body for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return result
+                del self._memory[key]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is not None and entry["expires_at"] > now:
+                self.disk_hits += 1
+                self._remember(key, entry["expires_at"], entry["result"])
+                return entry["result"]
+            self.misses += 1
+        return None
+
+    def put(self, key, result):
+        """Store a response body under key in both tiers"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, result)
+        self._write_disk(key, expires_at, result)
+
+    def _remember(self, key, expires_at, result):
+        self._memory[key] = (expires_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, expires_at, result):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        payload = json.dumps({"expires_at": expires_at, "result": result}, ensure_ascii=False)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Read-only or full disk: keep serving from memory
+            self.directory = None
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(p.stat().st_size for p in self.directory.glob("*/*.json"))
+            else:
+                self._disk_bytes += len(payload.encode("utf-8"))
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete expired files, then the oldest, until under max_disk_bytes"""
+        files = []
+        for p in self.directory.glob("*/*.json"):
+            try:
+                stat = p.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, p))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        cutoff = time.time() - self.ttl
+        for mtime, size, p in files:
+            if total <= self.max_disk_bytes * 0.9 and mtime > cutoff:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'evictions': self.evictions
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide cache, configured from the environment"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    directory=os.getenv("DEEPSEEK_CACHE_DIR", ".deepseek_cache"),
+                    ttl=float(os.getenv("DEEPSEEK_CACHE_TTL", str(24 * 3600))),
+                    max_entries=int(os.getenv("DEEPSEEK_CACHE_MAX_ENTRIES", "256"))
+                )
+    return _cache
@@ -0,0 +1,77 @@
+# Retry policy for transient DeepSeek failures
+# Exponential backoff with full jitter, split connect/read timeouts and a per-run retry budget
+import os
+import time
+import random
+import threading
+
+# Worth another attempt: timeouts, throttling and upstream gateway errors
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passed before it could be sent"""
+
+
+class RetryPolicy:
+    """How many times to try a request, how long to wait between tries and how
+    long to wait for the connection and for the response"""
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0,
+                 connect_timeout=5.0, read_timeout=30.0,
+                 retryable_status_codes=RETRYABLE_STATUS_CODES):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retryable_status_codes = retryable_status_codes
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_attempts=int(os.getenv("DEEPSEEK_MAX_ATTEMPTS", "3")),
+            connect_timeout=float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("DEEPSEEK_READ_TIMEOUT", "30"))
+        )
+
+    def is_retryable(self, status_code):
+        return status_code in self.retryable_status_codes
+
+    def timeouts(self, deadline=None):
+        """(connect, read) timeouts, shortened to fit a time.monotonic() deadline"""
+        if deadline is None:
+            return self.connect_timeout, self.read_timeout
+        remaining = max(deadline - time.monotonic(), 0.001)
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
+
+    def backoff(self, attempt):
+        """Seconds to wait after the given (1-based) failed attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    """Caps the number of retries spent across one generation run
+
+    Shared by every request in the run so a bad upstream can't multiply the
+    run time by max_attempts.
+    """
+
+    def __init__(self, max_retries=None):
+        if max_retries is None:
+            max_retries = int(os.getenv("DEEPSEEK_RETRY_BUDGET", "10"))
+        self.max_retries = max_retries
+        self.spent = 0
+        self._lock = threading.Lock()
+
+    def try_spend(self):
+        """Claim one retry; False once the budget is exhausted"""
+        with self._lock:
+            if self.spent >= self.max_retries:
+                return False
+            self.spent += 1
+            return True
+
+    def remaining(self):
+        with self._lock:
+            return self.max_retries - self.spent
@@ -0,0 +1,57 @@
+# Run summary: roll per-post API stats up into one report per generation run
+from datetime import datetime
+
+# Per-post fields copied into the summary's per-format table
+POST_STAT_FIELDS = ('latency', 'attempts', 'prompt_tokens', 'completion_tokens', 'finish_reason', 'model',
+                    'length_regenerated')
+
+
+def build_run_summary(posts, usage=None, api_attempts=None, spans=None):
+    """Summarize a run: totals, slowest/most expensive formats and one row per post
+
+    spans (finished tracing spans of the run) add a per-stage timing table.
+    """
+    api_attempts = api_attempts or []
+    formats = []
+    for post in posts:
+        row = {'number': post['number'], 'backup': bool(post.get('backup')), 'truncated': bool(post.get('truncated'))}
+        row.update({field: post.get(field) for field in POST_STAT_FIELDS})
+        formats.append(row)
+
+    timed = [row for row in formats if row['latency'] is not None]
+    costed = [row for row in formats if row['completion_tokens'] is not None]
+    slowest = max(timed, key=lambda row: row['latency'], default=None)
+    most_expensive = max(costed, key=lambda row: row['completion_tokens'], default=None)
+
+    return {
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'posts': len(posts),
+        'backups': sum(1 for row in formats if row['backup']),
+        'truncated': sum(1 for row in formats if row['truncated']),
+        'api_attempts': len(api_attempts),
+        'retries': sum(1 for attempt in api_attempts if attempt['attempt'] > 1),
+        'total_request_latency': round(sum(row['latency'] for row in timed), 3),
+        'slowest_format': slowest['number'] if slowest else None,
+        'most_expensive_format': most_expensive['number'] if most_expensive else None,
+        'usage': usage or {},
+        'stages': summarize_stages(spans or []),
+        'formats': formats
+    }
+
+
+def summarize_stages(spans):
+    """Count, total and slowest duration per stage name, with the slowest span's format"""
+    stages = {}
+    for span in spans:
+        if span['duration'] is None:
+            continue
+        stage = stages.setdefault(span['name'], {'count': 0, 'total': 0.0, 'max': 0.0, 'slowest_format': None})
+        stage['count'] += 1
+        stage['total'] += span['duration']
+        if span['duration'] >= stage['max']:
+            stage['max'] = span['duration']
+            stage['slowest_format'] = span['attributes'].get('format')
+    for stage in stages.values():
+        stage['total'] = round(stage['total'], 3)
+        stage['max'] = round(stage['max'], 3)
+    return stages
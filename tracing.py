@@ -0,0 +1,174 @@
+# Stage timing spans and optional profiling for generation runs
+# Spans go to pluggable sinks: a JSON log line per span and/or an in-memory ring buffer
+import os
+import sys
+import json
+import time
+import threading
+import cProfile
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+
+class Span:
+    """One timed stage: name, attributes, start time and duration"""
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.duration = None
+        self.error = None
+        self.thread = threading.current_thread().name
+        self._started = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'started_at': datetime.fromtimestamp(self.started_at).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            'duration': round(self.duration, 6) if self.duration is not None else None,
+            'thread': self.thread,
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+
+class JsonLogSink:
+    """Writes each finished span as one JSON line (stderr by default)"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, span):
+        line = json.dumps(dict(span.to_dict(), event='span'), default=str)
+        with self._lock:
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+            else:
+                print(line, file=sys.stderr)
+
+
+class RingBufferSink:
+    """Keeps the most recent finished spans in memory"""
+
+    def __init__(self, capacity=1000):
+        self._spans = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def emit(self, span):
+        with self._lock:
+            self._spans.append(span.to_dict())
+
+    def recent(self, limit=None, run=None):
+        """Most recent spans, oldest first, optionally only those of one run"""
+        with self._lock:
+            spans = list(self._spans)
+        if run is not None:
+            spans = [s for s in spans if s['attributes'].get('run') == run]
+        return spans[-limit:] if limit else spans
+
+
+class Tracer:
+    """Times stages with span() and hands each finished span to every sink"""
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span = Span(name, attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.finish()
+            for sink in self.sinks:
+                sink.emit(span)
+
+    def ring_buffer(self):
+        """The in-memory sink, if one is configured"""
+        return next((sink for sink in self.sinks if isinstance(sink, RingBufferSink)), None)
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Return the process-wide tracer, configured from the environment
+
+    TRACE_SINKS is a comma-separated list of 'memory' (ring buffer of
+    TRACE_BUFFER_SIZE spans) and 'json' (one line per span to TRACE_LOG_FILE,
+    or stderr); 'none' turns tracing output off.
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                sinks = []
+                for name in os.getenv("TRACE_SINKS", "memory").split(","):
+                    name = name.strip().lower()
+                    if name == "memory":
+                        sinks.append(RingBufferSink(int(os.getenv("TRACE_BUFFER_SIZE", "1000"))))
+                    elif name == "json":
+                        sinks.append(JsonLogSink(os.getenv("TRACE_LOG_FILE") or None))
+                _tracer = Tracer(sinks)
+    return _tracer
+
+
+@contextmanager
+def profiled(name, directory):
+    """Profile the enclosed block when the PROFILE env var asks for it
+
+    PROFILE=cprofile writes a .prof file (open with snakeviz or pstats);
+    PROFILE=pyinstrument writes an HTML report if pyinstrument is installed.
+    Both only sample the calling thread, so time spent in worker threads
+    shows up as waiting; the api_call spans cover those.
+    """
+    mode = os.getenv("PROFILE", "").strip().lower()
+    if mode not in ("cprofile", "pyinstrument"):
+        yield None
+        return
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = directory / f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("[WARN] pyinstrument not installed, falling back to cProfile")
+        else:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield profiler
+            finally:
+                profiler.stop()
+                path = stem.with_suffix(".html")
+                path.write_text(profiler.output_html(), encoding="utf-8")
+                print(f"[OK] Profile saved: {path}")
+            return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        path = stem.with_suffix(".prof")
+        profiler.dump_stats(str(path))
+        print(f"[OK] Profile saved: {path}")
@@ -0,0 +1,99 @@
+# Twitter weighted character counting and boundary-aware truncation
+# Follows twitter-text v3: 280 weighted characters, CJK/emoji count double, every URL counts as 23
+import re
+import unicodedata
+
+MAX_TWEET_LENGTH = 280
+URL_LENGTH = 23
+
+# Code points weighted 1 in twitter-text v3 (Latin, Greek, Cyrillic, ..., general punctuation);
+# everything else, including CJK, weighs 2
+_HEAVY = re.compile(r"[^\u0000-\u10ff\u2000-\u200d\u2010-\u201f\u2032-\u2037]")
+
+_URL = re.compile(
+    r"(?:https?://|www\.)[^\s]+"
+    r"|\b(?:[a-z0-9-]+\.)+(?:com|net|org|io|co|ai|app|dev|me|ly|gg|xyz|gov|edu)\b(?:/[^\s]*)?",
+    re.IGNORECASE
+)
+
+# One emoji, with skin tone / variation selector, optionally joined into a ZWJ sequence, or a flag
+_EMOJI_UNIT = r"[\u2600-\u27bf\U0001F000-\U0001FAFF][\ufe0f\U0001F3FB-\U0001F3FF]?"
+_EMOJI = re.compile(
+    r"[\U0001F1E6-\U0001F1FF]{2}"
+    rf"|[0-9#*]\ufe0f?\u20e3"
+    rf"|{_EMOJI_UNIT}(?:\u200d{_EMOJI_UNIT})*"
+)
+
+# An emoji sequence counts as 2 no matter how many code points it has
+_EMOJI_PLACEHOLDER = "\u4e00"
+_URL_PLACEHOLDER = "x" * URL_LENGTH
+
+# Western sentence ends need trailing whitespace; CJK full stops don't
+_SENTENCE_END = re.compile(r"(?<=[.!?\u2026])\s+|(?<=[\u3002\uff01\uff1f])")
+_WORD = re.compile(r"\S+\s*")
+
+
+def weighted_length(text):
+    """Tweet length as Twitter counts it"""
+    if text.isascii():
+        # Fast path: every ASCII character weighs 1, only URLs need normalizing
+        if "." not in text:
+            return len(text)
+        return len(_URL.sub(_URL_PLACEHOLDER, text))
+
+    text = unicodedata.normalize("NFC", text)
+    text = _URL.sub(_URL_PLACEHOLDER, text)
+    text = _EMOJI.sub(_EMOJI_PLACEHOLDER, text)
+    return len(text) + len(_HEAVY.findall(text))
+
+
+def fits(text, limit=MAX_TWEET_LENGTH):
+    return weighted_length(text) <= limit
+
+
+def truncate_tweet(text, limit=MAX_TWEET_LENGTH):
+    """Cut text to fit the limit at a line, then sentence, then word boundary
+
+    Whole lines are kept while they fit; if the next line doesn't, as many
+    of its sentences as fit are kept. If that keeps less than half the
+    limit, the text is cut between words instead, with an ellipsis.
+    """
+    if fits(text, limit):
+        return text
+
+    kept = []
+    for line in text.split("\n"):
+        candidate = "\n".join(kept + [line])
+        if fits(candidate, limit):
+            kept.append(line)
+            continue
+
+        # Longest run of whole sentences from the start of the line that still fits
+        prefix = ""
+        for match in _SENTENCE_END.finditer(line):
+            if not fits("\n".join(kept + [line[:match.start()]]), limit):
+                break
+            prefix = line[:match.start()]
+        if prefix:
+            kept.append(prefix)
+        break
+
+    result = "\n".join(kept).rstrip()
+    # A boundary that throws away most of the post is worse than a cut mid-sentence
+    if weighted_length(result) >= limit // 2:
+        return result
+
+    # Cut between words, keeping the original line breaks
+    end = 0
+    for match in _WORD.finditer(text):
+        if not fits(text[:match.end()].rstrip() + "\u2026", limit):
+            break
+        end = match.end()
+    if end:
+        return text[:end].rstrip() + "\u2026"
+
+    # A single unbroken run (e.g. CJK without punctuation): cut between characters
+    end = len(text)
+    while end and not fits(text[:end] + "\u2026", limit):
+        end -= max(1, (weighted_length(text[:end]) - limit) // 2)
+    return text[:end].rstrip() + "\u2026"
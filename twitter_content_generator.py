@@ -3,9 +3,27 @@ import os
 import schedule
 import time
 import json
+import asyncio
+import queue
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-import requests
+from deepseek_client import post_completion, apost_completion, stream_completion, async_client
+from deepseek_client import UsageTotals, usage_from_result, completion_metadata
+from retry_policy import RetryBudget
+from response_cache import get_response_cache, make_cache_key
+from hedging import Hedger
+from circuit_breaker import CircuitOpenError
+from run_summary import build_run_summary
+from tracing import get_tracer, profiled
+from metrics import generation_runs, posts_generated, pdf_render_duration
+from dedup_index import get_dedup_index, similarity
+from candidate_scoring import format_rules, pick_best
+from tweet_length import MAX_TWEET_LENGTH, weighted_length, truncate_tweet
+from post_store import write_posts
+from post_history import get_post_history
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -16,18 +34,105 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# System prompt optimized for TWITTER TRADING content based on viral examples
+# Module-level so every request starts with the same bytes and hits DeepSeek's prefix cache
+SYSTEM_PROMPT = """You are a viral TWITTER trading content creator. Your posts get 2K-658K views. You focus on TRADING PSYCHOLOGY, MARKET COMMENTARY, and PRACTICAL TRADING ADVICE.
+
+Your proven viral formats on Twitter:
+
+1. TRADING PSYCHOLOGY (Trading Composure - consistently 2K-6K views):
+   - Short, profound statements about the mental game
+   - "Trading is the hardest skill in the world. Not because of the charts... But because it forces you to master yourself."
+   - "'All in' is stupid. Trading is not one trade. Trading is thousands of small, boring, disciplined, positive EV decisions stacked quietly on top of each other."
+   - "The market is not your enemy. It doesn't know you exist. Your habits are the opponent. Your blind reactions are the opponent."
+
+2. PROCESS VS RESULTS THEME (Trading Composure - 3K-5K views):
+   - "Most traders want the results, but not the process. And that is why they fail."
+   - "Good trading isn't about seeing further. It's about reacting better."
+
+3. MARKET COMMENTARY (Peter Schiff - 17K-658K views):
+   - Use SPECIFIC numbers, prices, and timeframes
+   - "Gold is up over $75, trading above $4,838. Gold is up almost $250 so far this week..."
+   - Compare historical pace vs current pace of market moves
+
+4. EDUCATIONAL LISTS (TSDR Trading - 3.8K views):
+   - Bullet points with specific trading strategies
+   - "Embrace the gap down. Look for strength and reversals. Use multiple timeframes."
+   - End with memorable closer
+
+TWITTER STYLE RULES:
+- Keep it SHORT - Twitter rewards brevity (20-80 words ideal)
+- Use line breaks for emphasis and readability
+- Be bold and direct - no fluff
+- Focus on TRADING/MARKETS only (psychology, strategy, market commentary)
+- Use specific trading terms (EV, position sizing, timeframes, support/resistance)
+- Make it quotable and shareable
+- End strong - last line should hit hard
+
+AVOID:
+- Long paragraphs (break them up)
+- Generic advice
+- Investment advice for beginners
+- Non-trading topics
+
+Write like the viral Twitter trading accounts: sharp, insightful, memorable."""
+
+
 class TwitterContentGenerator:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, max_workers=None, hedge_percentile=None, batch_mode=None,
+                 use_cache=None, dedup=None, best_of=None):
         """Initialize Twitter Trading Content Generator"""
         # Set DeepSeek API key
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
         if not self.api_key:
             raise ValueError("Please set DEEPSEEK_API_KEY in .env file or pass api_key parameter")
 
+        # Maximum number of API requests in flight at once (1 = sequential)
+        self.max_workers = max_workers or int(os.getenv("DEEPSEEK_MAX_WORKERS", "10"))
+
+        # Optional hedging: duplicate requests slower than this latency percentile
+        hedge_percentile = hedge_percentile or float(os.getenv("DEEPSEEK_HEDGE_PERCENTILE", "0"))
+        self.hedger = Hedger(hedge_percentile) if hedge_percentile else None
+
+        # Batch mode: ask for every format in a single completion
+        if batch_mode is None:
+            batch_mode = os.getenv("DEEPSEEK_BATCH_MODE", "0") == "1"
+        self.batch_mode = batch_mode
+
+        # Best-of-N: ask for N candidates per request and keep the best-scoring one (1 = off)
+        self.best_of = best_of or int(os.getenv("DEEPSEEK_BEST_OF", "1"))
+
+        # Response cache for replays and development; off by default so runs get fresh content
+        if use_cache is None:
+            use_cache = os.getenv("DEEPSEEK_CACHE", "0") == "1"
+        self.cache = get_response_cache() if use_cache else None
+
+        # Stage timing spans (api_call, post_process, pdf, text, ...) go to the process-wide tracer
+        self.tracer = get_tracer()
+
+        # Called with each post as it is finished (used for job progress in the web interface)
+        self.post_callback = None
+
+        # Retry budget and per-attempt latency log for the current run
+        self.reset_run_stats()
+
         # Create Output folder
         self.output_folder = Path("Output")
         self.output_folder.mkdir(exist_ok=True)
 
+        # Near-duplicate check against every earlier post; repeats are regenerated before the PDF
+        if dedup is None:
+            dedup = os.getenv("DEDUP_ENABLED", "1") == "1"
+        self.dedup_index = get_dedup_index() if dedup else None
+        self.dedup_regenerations = int(os.getenv("DEDUP_MAX_REGENERATIONS", "2"))
+        self.dedup_window_days = int(os.getenv("DEDUP_WINDOW_DAYS", "0")) or None
+
+        # Searchable history of every run's posts (served at /search by the web dashboard)
+        self.history_enabled = os.getenv("POST_HISTORY_ENABLED", "1") == "1"
+
+        # Posts over Twitter's weighted 280-character limit are regenerated; truncation is the last resort
+        self.length_regenerations = int(os.getenv("TWEET_MAX_REGENERATIONS", "1"))
+
         # Twitter Trading Prompts - Based on VIRAL TWITTER POSTS
         # These formats have proven engagement: 2.8K - 658K views
 
@@ -100,122 +205,587 @@ class TwitterContentGenerator:
             alignment=TA_LEFT
         ))
 
-    def call_deepseek_api(self, prompt):
-        """Call DeepSeek API to generate content"""
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            # System prompt optimized for TWITTER TRADING content based on viral examples
-            system_prompt = """You are a viral TWITTER trading content creator. Your posts get 2K-658K views. You focus on TRADING PSYCHOLOGY, MARKET COMMENTARY, and PRACTICAL TRADING ADVICE.
-
-Your proven viral formats on Twitter:
-
-1. TRADING PSYCHOLOGY (Trading Composure - consistently 2K-6K views):
-   - Short, profound statements about the mental game
-   - "Trading is the hardest skill in the world. Not because of the charts... But because it forces you to master yourself."
-   - "'All in' is stupid. Trading is not one trade. Trading is thousands of small, boring, disciplined, positive EV decisions stacked quietly on top of each other."
-   - "The market is not your enemy. It doesn't know you exist. Your habits are the opponent. Your blind reactions are the opponent."
-
-2. PROCESS VS RESULTS THEME (Trading Composure - 3K-5K views):
-   - "Most traders want the results, but not the process. And that is why they fail."
-   - "Good trading isn't about seeing further. It's about reacting better."
-
-3. MARKET COMMENTARY (Peter Schiff - 17K-658K views):
-   - Use SPECIFIC numbers, prices, and timeframes
-   - "Gold is up over $75, trading above $4,838. Gold is up almost $250 so far this week..."
-   - Compare historical pace vs current pace of market moves
-
-4. EDUCATIONAL LISTS (TSDR Trading - 3.8K views):
-   - Bullet points with specific trading strategies
-   - "Embrace the gap down. Look for strength and reversals. Use multiple timeframes."
-   - End with memorable closer
+    def build_request(self, prompt):
+        """Build headers and payload for a DeepSeek chat completion"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+        data = {
+            "model": "deepseek-chat",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": f"{prompt}\n\nRespond with ONLY the post content. No explanations, no quotes, no meta-commentary. Just the raw tweet text."
+                }
+            ],
+            "temperature": 1.0,
+            "max_tokens": 300,
+            "stream": False
+        }
+        if self.best_of > 1:
+            data["n"] = self.best_of
+
+        return headers, data
+
+    def clean_content(self, content):
+        """Clean content: remove quotes and extra spaces"""
+        return content.strip().replace('"', '').replace("'", '').strip()
+
+    def select_content(self, result, prompt, stats):
+        """Cleaned content of a completion, picking the best candidate when it has several
+
+        Candidates are scored on word limit, layout, banned phrases and
+        distance from earlier posts; the score lands in stats.
+        """
+        candidates = [self.clean_content(choice['message']['content']) for choice in result['choices']]
+        candidates = [candidate for candidate in candidates if candidate]
+        if len(candidates) <= 1:
+            return candidates[0] if candidates else None
+
+        similarities = None
+        if self.dedup_index:
+            similarities = []
+            for candidate in candidates:
+                match = self.dedup_index.find_duplicate(candidate, max_age_days=self.dedup_window_days,
+                                                        min_similarity=0.0)
+                similarities.append(match['similarity'] if match else 0.0)
+
+        best, score, _ = pick_best(candidates, format_rules(prompt), similarities)
+        stats.update(candidates=len(candidates), candidate_score=round(score, 3))
+        return candidates[best]
+
+    def build_batch_request(self):
+        """Build one request asking for every format as a JSON array"""
+        headers, data = self.build_request("")
+        data.pop("n", None)
+
+        formats = "\n\n".join(f"FORMAT {i}: {prompt}" for i, prompt in enumerate(self.prompts, 1))
+        data["messages"][-1]["content"] = (
+            f"Write one post for each of these {len(self.prompts)} formats.\n\n{formats}\n\n"
+            'Respond with ONLY a JSON object of the form {"posts": [{"format": 1, "content": "..."}, ...]} '
+            f"with exactly one entry per format, formats 1 to {len(self.prompts)}. "
+            "Each content is the raw tweet text. No explanations, no meta-commentary."
+        )
+        data["max_tokens"] = 300 * len(self.prompts)
+        data["response_format"] = {"type": "json_object"}
+
+        return headers, data
+
+    def parse_batch_response(self, result):
+        """Parse a batch completion into {format number: cleaned content}
+
+        Entries that are missing, duplicated or malformed are left out so the
+        caller can regenerate them one at a time.
+        """
+        text = result['choices'][0]['message']['content'].strip()
+        # Tolerate a fenced code block around the JSON
+        if text.startswith("```"):
+            text = text.strip("`").split("\n", 1)[-1]
+
+        entries = json.loads(text)
+        if isinstance(entries, dict):
+            entries = entries.get("posts")
+        if not isinstance(entries, list):
+            raise ValueError("batch response has no posts array")
+
+        contents = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            number = entry.get("format")
+            content = entry.get("content")
+            if not isinstance(number, int) or not 1 <= number <= len(self.prompts):
+                continue
+            if not isinstance(content, str) or number in contents:
+                continue
+            content = self.clean_content(content)
+            if content:
+                contents[number] = content
+        return contents
+
+    def reset_run_stats(self):
+        """Start a fresh retry budget and attempt log for a generation run"""
+        self.run_id = uuid.uuid4().hex[:12]
+        self.retry_budget = RetryBudget()
+        self.api_attempts = []
+        self.usage = UsageTotals()
+        if self.hedger:
+            self.hedger.reset_stats()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time one stage of a run; the span is tagged with the run id"""
+        with self.tracer.span(name, **attributes) as span:
+            try:
+                yield span
+            finally:
+                # Tagged on exit: the run id is assigned when generation starts
+                span.attributes['run'] = self.run_id
+
+    def print_attempt_summary(self):
+        """Print API attempt count, retries and latency for the current run"""
+        if self.cache:
+            cache_stats = self.cache.stats()
+            print(f"Response cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits, "
+                  f"{cache_stats['misses']} misses (process total)")
+        if not self.api_attempts:
+            return
+        usage = self.usage.report()
+        if usage['requests']:
+            print(f"Prefix cache: {usage['prompt_cache_hit_tokens']} of "
+                  f"{usage['prompt_cache_hit_tokens'] + usage['prompt_cache_miss_tokens']} prompt tokens "
+                  f"({usage['prefix_cache_hit_rate']:.0%}) | {usage['completion_tokens']} completion tokens")
+        latencies = sorted(a['latency'] for a in self.api_attempts)
+        retries = sum(1 for a in self.api_attempts if a['attempt'] > 1)
+        print(f"API attempts: {len(latencies)} ({retries} retries) | "
+              f"median {latencies[len(latencies) // 2]:.2f}s | slowest {latencies[-1]:.2f}s")
+        if self.hedger:
+            hedge_stats = self.hedger.stats()
+            print(f"Hedged requests: {hedge_stats['fired']} fired, {hedge_stats['won']} won")
+
+    def _cached_result(self, cache_key, stats):
+        """Cached response body for cache_key, or None; fills stats for a hit"""
+        if not cache_key:
+            return None
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            stats.update(completion_metadata(cached), latency=0.0, attempts=0, cached=True)
+        return cached
+
+    def _handle_response(self, response, attempts, started, stats, cache_key, prompt):
+        """Record a finished request and return its content, or None if it failed"""
+        self.api_attempts.extend(attempts)
+        stats.update(latency=round(time.perf_counter() - started, 3), attempts=len(attempts))
+
+        if response is None:
+            print(f"API Exception: {attempts[-1]['error']}")
+            return None
 
-TWITTER STYLE RULES:
-- Keep it SHORT - Twitter rewards brevity (20-80 words ideal)
-- Use line breaks for emphasis and readability
-- Be bold and direct - no fluff
-- Focus on TRADING/MARKETS only (psychology, strategy, market commentary)
-- Use specific trading terms (EV, position sizing, timeframes, support/resistance)
-- Make it quotable and shareable
-- End strong - last line should hit hard
+        if response.status_code != 200:
+            print(f"API Error: {response.status_code}")
+            return None
 
-AVOID:
-- Long paragraphs (break them up)
-- Generic advice
-- Investment advice for beginners
-- Non-trading topics
+        result = response.json()
+        self.usage.add(usage_from_result(result))
+        stats.update(completion_metadata(result))
+        if cache_key:
+            self.cache.put(cache_key, result)
+        return self.select_content(result, prompt, stats)
 
-Write like the viral Twitter trading accounts: sharp, insightful, memorable."""
+    def call_deepseek_api(self, prompt, stats=None):
+        """Call DeepSeek API to generate content
 
-            data = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": f"{prompt}\n\nRespond with ONLY the post content. No explanations, no quotes, no meta-commentary. Just the raw tweet text."
-                    }
-                ],
-                "temperature": 1.0,
-                "max_tokens": 300,
-                "stream": False
-            }
-
-            response = requests.post(
-                "https://api.deepseek.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                content = result['choices'][0]['message']['content'].strip()
-                # Clean content: remove quotes and extra spaces
-                content = content.replace('"', '').replace("'", '').strip()
-                return content
-            else:
-                print(f"API Error: {response.status_code}")
-                return None
+        If a stats dict is passed it is filled with the request's latency,
+        attempt count, model, finish_reason and token counts.
+        """
+        stats = {} if stats is None else stats
+        try:
+            headers, data = self.build_request(prompt)
+            cache_key = make_cache_key(data) if self.cache else None
+            cached = self._cached_result(cache_key, stats)
+            if cached is not None:
+                return self.select_content(cached, prompt, stats)
+
+            started = time.perf_counter()
+            response, attempts = post_completion(headers, data, budget=self.retry_budget)
+            return self._handle_response(response, attempts, started, stats, cache_key, prompt)
+        except Exception as e:
+            print(f"API Exception: {e}")
+            return None
 
+    async def acall_deepseek_api(self, prompt, client, stats=None):
+        """Async version of call_deepseek_api using a shared httpx.AsyncClient"""
+        stats = {} if stats is None else stats
+        try:
+            headers, data = self.build_request(prompt)
+            cache_key = make_cache_key(data) if self.cache else None
+            cached = self._cached_result(cache_key, stats)
+            if cached is not None:
+                return self.select_content(cached, prompt, stats)
+
+            started = time.perf_counter()
+            response, attempts = await apost_completion(client, headers, data, budget=self.retry_budget)
+            return self._handle_response(response, attempts, started, stats, cache_key, prompt)
         except Exception as e:
             print(f"API Exception: {e}")
             return None
 
-    def generate_daily_posts(self):
+    def call_with_stats(self, prompt):
+        """Call the API for one prompt, returning (content, stats) or None on failure"""
+        stats = {}
+        content = self.call_deepseek_api(prompt, stats)
+        return (content, stats) if content else None
+
+    async def acall_with_stats(self, prompt, client):
+        """Async version of call_with_stats"""
+        stats = {}
+        content = await self.acall_deepseek_api(prompt, client, stats)
+        return (content, stats) if content else None
+
+    def generate_content(self, prompt):
+        """Call the API for one prompt, hedging slow requests when enabled
+
+        Returns (content, stats); content is None if the request failed.
+        """
+        if self.hedger:
+            return self.hedger.call(self.call_with_stats, prompt) or (None, {})
+        stats = {}
+        return self.call_deepseek_api(prompt, stats), stats
+
+    async def agenerate_content(self, prompt, client):
+        """Async version of generate_content"""
+        if self.hedger:
+            return await self.hedger.acall(self.acall_with_stats, prompt, client) or (None, {})
+        stats = {}
+        return await self.acall_deepseek_api(prompt, client, stats), stats
+
+    def length_prompt(self, prompt, content):
+        """Prompt for another try at a post that came back over the length limit"""
+        return (f"{prompt}\n\nYour previous draft was {weighted_length(content)} characters; "
+                f"Twitter allows {MAX_TWEET_LENGTH}. Write a shorter post that fits.")
+
+    def needs_shortening(self, content, retries):
+        """Whether content is over the length limit with regenerations left"""
+        return bool(content) and retries < self.length_regenerations and weighted_length(content) > MAX_TWEET_LENGTH
+
+    def merge_length_retry(self, content, stats, retry_content, retry_stats, retries):
+        """(content, stats) after a length regeneration
+
+        A failed retry keeps the original content and its stats; either way
+        latency and attempts cover both requests.
+        """
+        latency = stats.get('latency', 0.0) + retry_stats.get('latency', 0.0)
+        attempts = stats.get('attempts', 0) + retry_stats.get('attempts', 0)
+        if retry_content:
+            content, stats = retry_content, retry_stats
+        stats.update(latency=round(latency, 3), attempts=attempts, length_regenerated=retries)
+        return content, stats
+
+    def generate_format(self, i, avoid=None):
+        """Generate content for format i (1-based) inside an api_call span
+
+        avoid is an earlier post the new one must not repeat (used when
+        regenerating near-duplicates). Content over the tweet length limit
+        is regenerated up to length_regenerations times.
+        """
+        prompt = self.prompts[i - 1]
+        if avoid:
+            prompt += f"\n\nDo NOT repeat or closely paraphrase this earlier post: {avoid}"
+        with self.span("api_call", format=i, regenerate=bool(avoid)) as span:
+            content, stats = self.generate_content(prompt)
+            retries = 0
+            while self.needs_shortening(content, retries):
+                retries += 1
+                retry_content, retry_stats = self.generate_content(self.length_prompt(prompt, content))
+                content, stats = self.merge_length_retry(content, stats, retry_content, retry_stats, retries)
+            span.set(ok=content is not None, attempts=stats.get('attempts'), length_regenerated=retries)
+        return content, stats
+
+    def generate_daily_posts(self, max_workers=None):
         """Generate 10 daily Twitter posts"""
+        max_workers = max_workers or self.max_workers
+        self.reset_run_stats()
+        started = time.perf_counter()
+
         print(f"\n{'='*60}")
         print(f"Generating Content - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*60}")
 
-        posts = []
+        if self.batch_mode:
+            mode = "batch"
+            posts = self.generate_posts_batched(max_workers)
+        elif max_workers > 1:
+            mode = "concurrent"
+            posts = self.generate_posts_concurrently(max_workers)
+        else:
+            mode = "sequential"
+            posts = []
 
-        for i, prompt in enumerate(self.prompts, 1):
-            print(f"Generating post {i}/10...")
+            for i in range(1, len(self.prompts) + 1):
+                print(f"Generating post {i}/{len(self.prompts)}...")
 
-            content = self.call_deepseek_api(prompt)
+                content, stats = self.generate_format(i)
+                posts.append(self.build_post(i, content, stats))
 
-            if content:
-                # Twitter character limit is 280, but we want shorter, punchier posts
-                word_count = len(content.split())
-                max_words = 120  # Keep it concise for Twitter
+        posts = self.deduplicate_posts(posts, max_workers)
+        generation_runs.observe(time.perf_counter() - started, generator="local", mode=mode)
+        print(f"\n[OK] Successfully generated {len(posts)} posts")
+        self.print_attempt_summary()
+        return posts
+
+    def generate_posts_concurrently(self, max_workers, numbers=None, avoid=None):
+        """Send format prompts in parallel, at most max_workers at a time
+
+        numbers limits the run to those formats (1-based); default is all.
+        avoid maps format numbers to earlier posts they must not repeat.
+        """
+        numbers = numbers or range(1, len(self.prompts) + 1)
+        avoid = avoid or {}
+        print(f"Generating {len(numbers)} posts ({max_workers} requests in flight)...")
+
+        posts_by_number = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.generate_format, i, avoid.get(i)): i for i in numbers}
+
+            for future in as_completed(futures):
+                i = futures[future]
+                posts_by_number[i] = self.build_post(i, *future.result())
+
+        # Keep posts in format order regardless of completion order
+        return [posts_by_number[i] for i in sorted(posts_by_number)]
+
+    def generate_posts_batched(self, max_workers):
+        """Generate every format in one completion, regenerating any that come back bad"""
+        print(f"Generating {len(self.prompts)} posts in one batch request...")
+
+        contents = {}
+        headers, data = self.build_batch_request()
+        started = time.perf_counter()
+        with self.span("api_call", format="batch") as span:
+            try:
+                response, attempts = post_completion(headers, data, budget=self.retry_budget)
+            except CircuitOpenError as e:
+                response, attempts = None, [{'attempt': 1, 'status': None, 'latency': 0.0, 'error': str(e)}]
+            span.set(ok=response is not None and response.status_code == 200, attempts=len(attempts))
+        self.api_attempts.extend(attempts)
+
+        # Token counts belong to the whole batch, so posts only carry request-level stats
+        stats = {'latency': round(time.perf_counter() - started, 3), 'attempts': len(attempts), 'batch': True}
+
+        if response is None:
+            print(f"API Exception: {attempts[-1]['error']}")
+        elif response.status_code != 200:
+            print(f"API Error: {response.status_code}")
+        else:
+            try:
+                result = response.json()
+                self.usage.add(usage_from_result(result))
+                metadata = completion_metadata(result)
+                stats.update(model=metadata['model'], finish_reason=metadata['finish_reason'])
+                contents = self.parse_batch_response(result)
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                print(f"Batch response could not be parsed: {e}")
+
+        # Over-length entries are regenerated on their own rather than truncated
+        contents = {i: content for i, content in contents.items() if weighted_length(content) <= MAX_TWEET_LENGTH}
+        posts_by_number = {i: self.build_post(i, content, stats) for i, content in contents.items()}
+
+        missing = [i for i in range(1, len(self.prompts) + 1) if i not in contents]
+        if missing:
+            print(f"Regenerating {len(missing)} missing, malformed or over-length formats individually...")
+            for post in self.generate_posts_concurrently(max_workers, missing):
+                posts_by_number[post['number']] = post
+
+        return [posts_by_number[i] for i in sorted(posts_by_number)]
+
+    async def agenerate_daily_posts(self, max_concurrency=None, client=None):
+        """Generate daily posts on the running event loop
+
+        Pass an httpx.AsyncClient to share connections across runs; otherwise
+        a client is opened for this batch only.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_workers)
+        self.reset_run_stats()
+        started = time.perf_counter()
+
+        async def generate_one(i, prompt, client):
+            async with semaphore:
+                with self.span("api_call", format=i) as span:
+                    content, stats = await self.agenerate_content(prompt, client)
+                    retries = 0
+                    while self.needs_shortening(content, retries):
+                        retries += 1
+                        retry_content, retry_stats = await self.agenerate_content(
+                            self.length_prompt(prompt, content), client)
+                        content, stats = self.merge_length_retry(content, stats, retry_content, retry_stats, retries)
+                    span.set(ok=content is not None, attempts=stats.get('attempts'), length_regenerated=retries)
+            return self.build_post(i, content, stats)
+
+        async def generate_all(client):
+            return await asyncio.gather(*(
+                generate_one(i, prompt, client)
+                for i, prompt in enumerate(self.prompts, 1)
+            ))
+
+        if client is not None:
+            posts = list(await generate_all(client))
+        else:
+            async with async_client() as client:
+                posts = list(await generate_all(client))
+
+        # Regenerations are rare; run them on the sync client off the event loop
+        posts = await asyncio.to_thread(self.deduplicate_posts, posts)
+        generation_runs.observe(time.perf_counter() - started, generator="local", mode="async")
+        print(f"\n[OK] Successfully generated {len(posts)} posts")
+        self.print_attempt_summary()
+        return posts
+
+    def stream_deepseek_api(self, prompt, stats=None):
+        """Yield content deltas for one prompt as the API streams them
+
+        If a stats dict is passed it is filled like call_deepseek_api's:
+        latency (to the last token), attempts, model, finish_reason and
+        token counts.
+        """
+        stats = {} if stats is None else stats
+        headers, data = self.build_request(prompt)
+        # Streamed tokens are shown as they arrive, so there is nothing to pick between
+        data.pop("n", None)
+        attempts, result = [], {}
+        started = time.perf_counter()
+        try:
+            yield from stream_completion(headers, data, attempts=attempts, result=result)
+        finally:
+            self.api_attempts.extend(attempts)
+            stats.update(latency=round(time.perf_counter() - started, 3), attempts=len(attempts))
+        if result.get("usage"):
+            self.usage.add(usage_from_result(result))
+        stats.update(completion_metadata(result))
+
+    def stream_daily_posts(self, max_workers=None):
+        """Generate all posts with streaming, yielding events as tokens arrive
+
+        Yields ('token', {'number', 'text'}) for every content delta and
+        ('post', post) once a post is final (length-limited or backup-filled).
+        Streamed tokens are already shown, so over-length posts are truncated
+        rather than regenerated.
+        Posts stream in parallel, so events arrive in completion order.
+        """
+        self.reset_run_stats()
+        events = queue.Queue()
+
+        def stream_one(i, prompt):
+            parts = []
+            stats = {}
+            with self.span("api_call", format=i, stream=True) as span:
+                try:
+                    for delta in self.stream_deepseek_api(prompt, stats):
+                        parts.append(delta)
+                        events.put(('token', {'number': i, 'text': delta}))
+                    content = self.clean_content(''.join(parts))
+                except Exception as e:
+                    print(f"API Exception: {e}")
+                    content = None
+                span.set(ok=bool(content), attempts=stats.get('attempts'))
+            events.put(('post', self.build_post(i, content, stats)))
+
+        started = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=max_workers or self.max_workers)
+        try:
+            for i, prompt in enumerate(self.prompts, 1):
+                executor.submit(stream_one, i, prompt)
+
+            posts = []
+            remaining = len(self.prompts)
+            while remaining:
+                event = events.get()
+                if event[0] == 'post':
+                    remaining -= 1
+                    posts.append(event[1])
+                yield event
+
+            # Near-duplicates are replaced after streaming; a second 'post' event supersedes the first
+            posts.sort(key=lambda post: post['number'])
+            for post in self.deduplicate_posts(posts, max_workers):
+                if post.get('regenerated') or post.get('backup_swapped'):
+                    yield ('post', post)
+            generation_runs.observe(time.perf_counter() - started, generator="local", mode="stream")
+        finally:
+            # Don't hold the caller if the client went away mid-stream
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def find_duplicates(self, posts):
+        """{format number: match} for posts that nearly repeat history or an earlier post of this run"""
+        duplicates = {}
+        seen = []
+        for post in posts:
+            signature = self.dedup_index.signature(post['content'])
+            match = self.dedup_index.find_duplicate(signature=signature, max_age_days=self.dedup_window_days)
+            for earlier, earlier_signature in seen:
+                score = similarity(signature, earlier_signature)
+                if score >= self.dedup_index.threshold and (match is None or score > match['similarity']):
+                    match = {'id': None, 'content': earlier['content'], 'similarity': round(score, 3),
+                             'same_run_format': earlier['number']}
+            if match:
+                duplicates[post['number']] = match
+            seen.append((post, signature))
+        return duplicates
+
+    def deduplicate_posts(self, posts, max_workers=None):
+        """Replace near-duplicates of earlier posts, then add the run to the history index
+
+        API posts that repeat history are regenerated (up to
+        dedup_regenerations rounds) with the earlier post quoted as one to
+        avoid. A backup that repeats history is swapped for another backup
+        that doesn't, when one exists. Posts still duplicated after that are
+        kept and marked 'near_duplicate' with the similarity score.
+        """
+        if not self.dedup_index or not posts:
+            return posts
+
+        with self.span("dedup", posts=len(posts)) as span:
+            posts_by_number = {post['number']: post for post in posts}
+            regenerated = 0
+            for round_number in range(self.dedup_regenerations + 1):
+                duplicates = self.find_duplicates([posts_by_number[i] for i in sorted(posts_by_number)])
+                numbers = [i for i in duplicates if not posts_by_number[i].get('backup')]
+                if not numbers or round_number == self.dedup_regenerations:
+                    break
+
+                print(f"Regenerating {len(numbers)} near-duplicate posts...")
+                avoid = {i: duplicates[i]['content'] for i in numbers}
+                for post in self.generate_posts_concurrently(max_workers or self.max_workers, numbers, avoid):
+                    post['regenerated'] = True
+                    posts_by_number[post['number']] = post
+                regenerated += len(numbers)
+
+            for i, match in duplicates.items():
+                post = posts_by_number[i]
+                if post.get('backup') and self.swap_backup(post, posts_by_number):
+                    continue
+                post['near_duplicate'] = match['similarity']
+
+            posts = [posts_by_number[i] for i in sorted(posts_by_number)]
+            self.dedup_index.add_many([post['content'] for post in posts])
+            span.set(duplicates_found=len(duplicates), regenerated=regenerated)
+        return posts
 
-                if word_count > max_words:
-                    words = content.split()[:max_words]
-                    content = ' '.join(words) + "..."
+    def swap_backup(self, post, posts_by_number):
+        """Give a duplicated backup post another backup that isn't in history; False if none is left"""
+        in_use = {p['content'] for p in posts_by_number.values()}
+        for offset in range(1, 10):
+            candidate = self.get_backup_content(post['number'] + offset)
+            if candidate in in_use or self.dedup_index.find_duplicate(candidate, max_age_days=self.dedup_window_days):
+                continue
+            post.update(content=candidate, backup_swapped=True)
+            return True
+        return False
+
+    def build_post(self, i, content, stats=None):
+        """Turn API content into a post dict, falling back to backup content
+
+        stats from the API call (latency, attempts, tokens, ...) are stored on
+        the post, for backups too.
+        """
+        with self.span("post_process", format=i):
+            if content:
+                # Still over Twitter's weighted limit after regeneration: cut at a line or sentence boundary
+                truncated = truncate_tweet(content)
 
                 post_item = {
                     'number': i,
-                    'content': content,
+                    'content': truncated,
                     'timestamp': datetime.now().strftime("%H:%M")
                 }
-                posts.append(post_item)
+                if truncated != content:
+                    post_item['truncated'] = True
+                    content = truncated
                 try:
                     print(f"  [OK] {content[:50]}...")
                 except UnicodeEncodeError:
@@ -229,16 +799,17 @@ Write like the viral Twitter trading accounts: sharp, insightful, memorable."""
                     'timestamp': datetime.now().strftime("%H:%M"),
                     'backup': True
                 }
-                posts.append(post_item)
                 try:
                     print(f"  [BACKUP] Using backup: {backup_content[:50]}...")
                 except UnicodeEncodeError:
                     print(f"  [BACKUP] Using backup content (Post #{i})")
 
-            time.sleep(1)  # Avoid API rate limits
-
-        print(f"\n[OK] Successfully generated {len(posts)} posts")
-        return posts
+            if stats:
+                post_item.update(stats)
+            posts_generated.inc(generator="local", source="backup" if post_item.get('backup') else "api")
+            if self.post_callback:
+                self.post_callback(post_item)
+            return post_item
 
     def get_backup_content(self, index):
         """Get backup content (used when API fails) - Based on PROVEN viral Twitter posts"""
@@ -277,6 +848,7 @@ Write like the viral Twitter trading accounts: sharp, insightful, memorable."""
 
     def create_pdf(self, posts):
         """Create PDF file"""
+        started = time.perf_counter()
         # Generate filename
         date_str = datetime.now().strftime("%Y%m%d")
         filename = self.output_folder / f"Twitter_Posts_{date_str}.pdf"
@@ -301,6 +873,7 @@ Write like the viral Twitter trading accounts: sharp, insightful, memorable."""
 
         # Build PDF
         doc.build(story)
+        pdf_render_duration.observe(time.perf_counter() - started)
         print(f"[OK] PDF saved: {filename}")
         return filename
 
@@ -321,33 +894,95 @@ Write like the viral Twitter trading accounts: sharp, insightful, memorable."""
 
         print(f"[OK] Text backup saved: {filename}")
 
-    def run_daily_generation(self):
-        """Run daily generation task"""
+    def save_as_jsonl(self, posts):
+        """Save one JSON record per post; the web dashboard reads posts from this file"""
+        date_str = datetime.now().strftime("%Y%m%d")
+        filename = write_posts(self.output_folder / f"Twitter_Posts_{date_str}.jsonl", posts)
+
+        print(f"[OK] Post records saved: {filename}")
+        return filename
+
+    def save_to_history(self, posts):
+        """Add the run's posts to the searchable history; a failure here doesn't fail the run"""
+        if not self.history_enabled:
+            return 0
         try:
-            # Generate content
-            posts = self.generate_daily_posts()
+            stored = get_post_history().add_run(posts, run_id=self.run_id)
+        except Exception as e:
+            print(f"[WARN] Post history not updated: {e}")
+            return 0
+        print(f"[OK] Post history updated: {stored} posts")
+        return stored
+
+    def run_summary(self, posts):
+        """Roll per-post latency, attempts and tokens up into a run summary"""
+        buffer = self.tracer.ring_buffer()
+        spans = buffer.recent(run=self.run_id) if buffer else None
+        return build_run_summary(posts, self.usage.report(), self.api_attempts, spans)
+
+    def save_run_summary(self, posts):
+        """Save the run summary as JSON next to the PDF and text files"""
+        date_str = datetime.now().strftime("%Y%m%d")
+        filename = self.output_folder / f"Twitter_Posts_{date_str}_summary.json"
 
-            if posts:
-                # Create PDF
-                pdf_file = self.create_pdf(posts)
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.run_summary(posts), f, indent=2)
 
-                # Save text backup
-                self.save_as_text(posts)
+        print(f"[OK] Run summary saved: {filename}")
+        return filename
 
-                # Print summary
-                print(f"\n{'='*60}")
-                print("Content generation complete!")
-                print(f"PDF file: {pdf_file}")
-                print(f"Location: {self.output_folder.absolute()}")
-                print(f"{'='*60}")
+    def run_daily_generation(self, raise_errors=False):
+        """Run daily generation task
 
-                return True
-            else:
-                print("[ERROR] Content generation failed")
-                return False
+        Each stage is timed as a span; set PROFILE=cprofile or pyinstrument
+        to also save a profile of the whole run under Output/profiles.
+        Returns False on failure, or raises the error if raise_errors is set
+        (used by web jobs, which report it).
+        """
+        try:
+            with profiled("run_daily_generation", self.output_folder / "profiles"), \
+                    self.span("run_daily_generation") as run_span:
+                # Generate content
+                with self.span("generate"):
+                    posts = self.generate_daily_posts()
+                run_span.set(posts=len(posts))
+
+                if posts:
+                    # Create PDF
+                    with self.span("pdf", posts=len(posts)):
+                        pdf_file = self.create_pdf(posts)
+
+                    # Save text backup
+                    with self.span("text", posts=len(posts)):
+                        self.save_as_text(posts)
+                        self.save_as_jsonl(posts)
+
+                    # Add to the searchable history
+                    with self.span("history", posts=len(posts)):
+                        self.save_to_history(posts)
+
+                    # Save per-format latency / token summary
+                    with self.span("summary"):
+                        self.save_run_summary(posts)
+
+                    # Print summary
+                    print(f"\n{'='*60}")
+                    print("Content generation complete!")
+                    print(f"PDF file: {pdf_file}")
+                    print(f"Location: {self.output_folder.absolute()}")
+                    print(f"{'='*60}")
+
+                    return True
+                else:
+                    print("[ERROR] Content generation failed")
+                    if raise_errors:
+                        raise RuntimeError("Content generation failed: no posts were generated")
+                    return False
 
         except Exception as e:
             print(f"[ERROR] Error during generation: {e}")
+            if raise_errors:
+                raise
             return False
 
     def setup_scheduler(self, run_time="17:00"):
@@ -3,123 +3,395 @@
 import os
 import time
 import json
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-import requests
+from deepseek_client import post_completion, apost_completion, stream_completion, async_client
+from deepseek_client import UsageTotals, usage_from_result, completion_metadata
+from retry_policy import RetryBudget
+from run_summary import build_run_summary
+from response_cache import get_response_cache, make_cache_key
+from metrics import generation_runs, posts_generated
+from tweet_length import truncate_tweet
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# System prompt optimized for TWITTER TRADING content based on viral examples
+# Module-level so every request starts with the same bytes and hits DeepSeek's prefix cache
+SYSTEM_PROMPT = """You are a viral TWITTER trading content creator. Your posts get 2K-658K views. Focus on TRADING PSYCHOLOGY, MARKET COMMENTARY, and PRACTICAL TRADING ADVICE.
+
+TWITTER STYLE RULES:
+- Keep it SHORT (20-80 words ideal)
+- Use line breaks for emphasis
+- Be bold and direct
+- Focus on TRADING/MARKETS only
+- Make it quotable and shareable
+- End strong
+
+Write like viral Twitter trading accounts: sharp, insightful, memorable."""
+
+
 class TwitterContentGenerator:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, use_cache=None):
         """Initialize Twitter Trading Content Generator for serverless"""
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
         if not self.api_key:
             raise ValueError("Please set DEEPSEEK_API_KEY")
 
-        # 5 prompts optimized for Vercel timeout
+        # Response cache for replays and development; off by default so runs get fresh content
+        if use_cache is None:
+            use_cache = os.getenv("DEEPSEEK_CACHE", "0") == "1"
+        self.cache = get_response_cache() if use_cache else None
+
+        # Retry budget and per-attempt latency log for the current run
+        self.reset_run_stats()
+
+        # Called with each post as it is finished (used for job progress in the web interface)
+        self.post_callback = None
+
+        # Total time budget for generate_posts; keeps a run inside the Vercel function limit
+        self.deadline = float(os.getenv("GENERATION_DEADLINE_SECONDS", "8"))
+
+        # All 10 formats: requests run in parallel under the deadline instead of one by one
         self.prompts = [
             "Create a short philosophical post about trading psychology. Format: '[Bold statement about trading]. [Elaboration in 1-2 sentences]. [Ending that drives it home].' Keep it under 50 words. Make it profound about the mental game of trading.",
 
-            "Write a post contrasting what traders want vs what they need. Format: 'Most traders want [X], but not [Y]. And that is why they fail.' Keep it SHORT - 2 lines maximum, under 20 words total.",
+            "Create a post debunking 'all in' mentality in trading. Start with a bold statement like ''All in' is stupid.' Then explain what trading really is (thousands of small decisions). Keep under 40 words. Make it educational but blunt.",
 
-            "Write a bold market commentary post with SPECIFIC numbers and timeframes. Pick a trending asset (Bitcoin, Gold, stocks, etc) and make a prediction or observation with exact prices, percentages, or dollar amounts. Keep under 80 words.",
+            "Write a post about what trading reveals about a person. Format: 'Trading reveals your relationship with [X, Y, and Z].' Keep it SHORT - under 25 words. Make it introspective.",
 
             "Create a post about the real enemy in trading. Start with: 'The market is not your enemy. It doesn't know you exist.' Then list 3 things that ARE the opponent. Use line breaks. Keep under 50 words.",
 
+            "Write a post contrasting what traders want vs what they need. Format: 'Most traders want [X], but not [Y]. And that is why they fail.' Keep it SHORT - 2 lines maximum, under 20 words total.",
+
+            "Create a post about execution over prediction. Format: 'Good trading isn't about [X]. It's about [Y].' Keep it ultra-short - under 20 words. Make it memorable.",
+
+            "Write practical trading advice for different market conditions. Format: 'In bull markets, [advice]. In bear markets, [advice]. And [risk management]. It's really that simple... [Ending line].' Keep under 60 words.",
+
+            "Create a one-liner philosophical post about knowledge vs ignorance in trading. Keep it under 20 words. Make it hit HARD. Focus on overconfidence, false certainty, or Dunning-Kruger in trading.",
+
+            "Write a bold market commentary post with SPECIFIC numbers and timeframes. Pick a trending asset (Bitcoin, Gold, stocks, etc) and make a prediction or observation with exact prices, percentages, or dollar amounts. Keep under 80 words.",
+
             "Create an educational post with 5 trading tips in bullet point format. Start with a bold opening statement, then list 5 specific trading strategies. Keep each bullet SHORT. End with a memorable closer. Total under 100 words."
         ]
 
-    def call_deepseek_api(self, prompt):
-        """Call DeepSeek API to generate content"""
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+    def reset_run_stats(self):
+        """Start a fresh retry budget and attempt log for a generation run"""
+        self.retry_budget = RetryBudget()
+        self.api_attempts = []
+        self.usage = UsageTotals()
 
-            system_prompt = """You are a viral TWITTER trading content creator. Your posts get 2K-658K views. Focus on TRADING PSYCHOLOGY, MARKET COMMENTARY, and PRACTICAL TRADING ADVICE.
+    def build_request(self, prompt):
+        """Build headers and payload for a DeepSeek chat completion"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
 
-TWITTER STYLE RULES:
-- Keep it SHORT (20-80 words ideal)
-- Use line breaks for emphasis
-- Be bold and direct
-- Focus on TRADING/MARKETS only
-- Make it quotable and shareable
-- End strong
+        data = {
+            "model": "deepseek-chat",
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"{prompt}\n\nRespond with ONLY the post content. No explanations."}
+            ],
+            "temperature": 1.0,
+            "max_tokens": 300,
+            "stream": False
+        }
 
-Write like viral Twitter trading accounts: sharp, insightful, memorable."""
+        return headers, data
 
-            data = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"{prompt}\n\nRespond with ONLY the post content. No explanations."}
-                ],
-                "temperature": 1.0,
-                "max_tokens": 300,
-                "stream": False
-            }
+    def parse_response(self, result):
+        """Extract cleaned post content from a completion response body"""
+        return self.clean_content(result['choices'][0]['message']['content'])
 
-            response = requests.post(
-                "https://api.deepseek.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                content = result['choices'][0]['message']['content'].strip()
-                content = content.replace('"', '').replace("'", '').strip()
-                return content
-            else:
-                return None
+    def clean_content(self, content):
+        """Remove quotes and extra spaces from generated content"""
+        return content.strip().replace('"', '').replace("'", '').strip()
+
+    def _cached_result(self, cache_key, stats):
+        """Cached response body for cache_key, or None; fills stats for a hit"""
+        if not cache_key:
+            return None
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            stats.update(completion_metadata(cached), latency=0.0, attempts=0, cached=True)
+        return cached
+
+    def _handle_response(self, response, attempts, started, stats, cache_key):
+        """Record a finished request and return its content, or None if it failed"""
+        self.api_attempts.extend(attempts)
+        stats.update(latency=round(time.perf_counter() - started, 3), attempts=len(attempts))
+
+        if response is None:
+            print(f"API Exception: {attempts[-1]['error']}")
+            return None
 
+        if response.status_code != 200:
+            return None
+
+        result = response.json()
+        self.usage.add(usage_from_result(result))
+        stats.update(completion_metadata(result))
+        if cache_key:
+            self.cache.put(cache_key, result)
+        return self.parse_response(result)
+
+    def call_deepseek_api(self, prompt, stats=None, deadline=None):
+        """Call DeepSeek API to generate content
+
+        If a stats dict is passed it is filled with the request's latency,
+        attempt count, model, finish_reason and token counts. deadline is a
+        time.monotonic() timestamp the request and its retries must fit in.
+        """
+        stats = {} if stats is None else stats
+        try:
+            headers, data = self.build_request(prompt)
+            cache_key = make_cache_key(data) if self.cache else None
+            cached = self._cached_result(cache_key, stats)
+            if cached is not None:
+                return self.parse_response(cached)
+
+            started = time.perf_counter()
+            response, attempts = post_completion(headers, data, budget=self.retry_budget, deadline=deadline)
+            return self._handle_response(response, attempts, started, stats, cache_key)
         except Exception as e:
             print(f"API Exception: {e}")
             return None
 
-    def generate_posts(self):
-        """Generate 5 posts and return as list (no file I/O)"""
-        posts = []
+    async def acall_deepseek_api(self, prompt, client, stats=None, deadline=None):
+        """Async version of call_deepseek_api using a shared httpx.AsyncClient"""
+        stats = {} if stats is None else stats
+        try:
+            headers, data = self.build_request(prompt)
+            cache_key = make_cache_key(data) if self.cache else None
+            cached = self._cached_result(cache_key, stats)
+            if cached is not None:
+                return self.parse_response(cached)
 
-        for i, prompt in enumerate(self.prompts, 1):
-            content = self.call_deepseek_api(prompt)
+            started = time.perf_counter()
+            response, attempts = await apost_completion(client, headers, data, budget=self.retry_budget,
+                                                        deadline=deadline)
+            return self._handle_response(response, attempts, started, stats, cache_key)
+        except Exception as e:
+            print(f"API Exception: {e}")
+            return None
 
-            if content:
-                word_count = len(content.split())
-                max_words = 120
+    def stream_deepseek_api(self, prompt, stats=None, deadline=None):
+        """Yield content deltas for one prompt as the API streams them
 
-                if word_count > max_words:
-                    words = content.split()[:max_words]
-                    content = ' '.join(words) + "..."
+        If a stats dict is passed it is filled like call_deepseek_api's:
+        latency (to the last token), attempts, model, finish_reason and
+        token counts.
+        """
+        stats = {} if stats is None else stats
+        headers, data = self.build_request(prompt)
+        attempts, result = [], {}
+        started = time.perf_counter()
+        try:
+            yield from stream_completion(headers, data, deadline=deadline, attempts=attempts, result=result)
+        finally:
+            self.api_attempts.extend(attempts)
+            stats.update(latency=round(time.perf_counter() - started, 3), attempts=len(attempts))
+        if result.get("usage"):
+            self.usage.add(usage_from_result(result))
+        stats.update(completion_metadata(result))
 
-                posts.append({
-                    'number': i,
-                    'content': content,
-                    'timestamp': datetime.now().strftime("%H:%M")
-                })
-            else:
-                # Backup content
-                backup = self.get_backup_content(i)
-                posts.append({
-                    'number': i,
-                    'content': backup,
-                    'timestamp': datetime.now().strftime("%H:%M"),
-                    'backup': True
-                })
+    def stream_posts(self, max_workers=None, deadline=None):
+        """Generate all posts with streaming, yielding events as tokens arrive
+
+        Yields ('token', {'number', 'text'}) for every content delta and
+        ('post', post) once a post is final (truncated or backup-filled).
+        Posts stream in parallel, so events arrive in completion order.
+        Same time budget as generate_posts: slots still streaming when it
+        runs out get backup posts marked 'deadline_exceeded'.
+        """
+        self.reset_run_stats()
+        events = queue.Queue()
+        started = time.monotonic()
+        deadline_at = started + (deadline or self.deadline)
+        # Numbers whose post was already queued; a straggler finishing after the deadline is dropped
+        settled = set()
+        settled_lock = threading.Lock()
+
+        def stream_one(i, prompt):
+            parts = []
+            stats = {}
+            try:
+                for delta in self.stream_deepseek_api(prompt, stats, deadline_at):
+                    if i in settled:
+                        return
+                    parts.append(delta)
+                    events.put(('token', {'number': i, 'text': delta}))
+                content = self.clean_content(''.join(parts))
+            except Exception as e:
+                print(f"API Exception: {e}")
+                content = None
+            with settled_lock:
+                if i not in settled:
+                    settled.add(i)
+                    events.put(('post', self.build_post(i, content, stats)))
+
+        executor = ThreadPoolExecutor(max_workers=max_workers or len(self.prompts))
+        try:
+            for i, prompt in enumerate(self.prompts, 1):
+                executor.submit(stream_one, i, prompt)
+
+            remaining = len(self.prompts)
+            while remaining:
+                try:
+                    event = events.get(timeout=max(deadline_at - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if event[0] == 'post':
+                    remaining -= 1
+                yield event
+
+            # Deadline passed: send what was queued in the meantime, then back-fill the rest
+            with settled_lock:
+                late = []
+                while not events.empty():
+                    late.append(events.get_nowait())
+                unfinished = [i for i in range(1, len(self.prompts) + 1) if i not in settled]
+                settled.update(unfinished)
+            yield from late
+            for i in unfinished:
+                yield ('post', self.build_post(i, None, {'deadline_exceeded': True}))
+            generation_runs.observe(time.monotonic() - started, generator="serverless", mode="stream")
+        finally:
+            # Don't hold the caller if the client went away mid-stream
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def build_post(self, i, content, stats=None):
+        """Turn API content into a post dict, falling back to backup content"""
+        stats = stats or {}
 
-            time.sleep(0.5)
+        if content:
+            # No time in the deadline for a regeneration: cut at a line or sentence boundary instead
+            truncated = truncate_tweet(content)
 
+            posts_generated.inc(generator="serverless", source="api")
+            post = {
+                'number': i,
+                'content': truncated,
+                'timestamp': datetime.now().strftime("%H:%M"),
+                **stats
+            }
+            if truncated != content:
+                post['truncated'] = True
+            if self.post_callback:
+                self.post_callback(post)
+            return post
+
+        # Backup content
+        backup = self.get_backup_content(i)
+        posts_generated.inc(generator="serverless", source="backup")
+        post = {
+            'number': i,
+            'content': backup,
+            'timestamp': datetime.now().strftime("%H:%M"),
+            'backup': True,
+            **stats
+        }
+        if self.post_callback:
+            self.post_callback(post)
+        return post
+
+    def generate_posts(self, deadline=None):
+        """Generate all posts within a time budget and return as list (no file I/O)
+
+        deadline is the total budget in seconds (GENERATION_DEADLINE_SECONDS by
+        default). Requests run in parallel with timeouts and retries bounded by
+        the budget. Slots still unanswered when it runs out are abandoned and
+        filled with backup content marked 'deadline_exceeded'.
+        """
+        budget = deadline or self.deadline
+        started = time.monotonic()
+        deadline_at = started + budget
+        self.reset_run_stats()
+
+        executor = ThreadPoolExecutor(max_workers=len(self.prompts))
+        futures = {}
+        for i, prompt in enumerate(self.prompts, 1):
+            stats = {}
+            future = executor.submit(self.call_deepseek_api, prompt, stats, deadline_at)
+            futures[future] = (i, stats)
+
+        done, _ = wait(futures, timeout=max(deadline_at - time.monotonic(), 0))
+        # Don't wait for stragglers; they stop at their own deadline-bounded timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        posts = []
+        for future, (i, stats) in futures.items():
+            if future in done:
+                posts.append(self.build_post(i, future.result(), stats))
+            else:
+                posts.append(self.build_post(i, None, {'deadline_exceeded': True}))
+
+        generation_runs.observe(time.monotonic() - started, generator="serverless", mode="parallel")
         return posts
 
+    async def agenerate_posts(self, max_concurrency=None, client=None, deadline=None):
+        """Generate all posts on the running event loop (no file I/O)
+
+        Same deadline handling as generate_posts, except that unfinished
+        requests are cancelled. Pass an httpx.AsyncClient to share connections
+        across calls; otherwise a client is opened for this batch only.
+        """
+        budget = deadline or self.deadline
+        started = time.monotonic()
+        deadline_at = started + budget
+        semaphore = asyncio.Semaphore(max_concurrency or len(self.prompts))
+        self.reset_run_stats()
+
+        async def generate_one(i, prompt, client):
+            stats = {}
+            async with semaphore:
+                content = await self.acall_deepseek_api(prompt, client, stats, deadline_at)
+            return self.build_post(i, content, stats)
+
+        async def generate_all(client):
+            tasks = [
+                asyncio.ensure_future(generate_one(i, prompt, client))
+                for i, prompt in enumerate(self.prompts, 1)
+            ]
+            done, pending = await asyncio.wait(tasks, timeout=max(deadline_at - time.monotonic(), 0))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+            posts = [
+                task.result() if task in done else self.build_post(i, None, {'deadline_exceeded': True})
+                for i, task in enumerate(tasks, 1)
+            ]
+            generation_runs.observe(time.monotonic() - started, generator="serverless", mode="async")
+            return posts
+
+        if client is not None:
+            return await generate_all(client)
+
+        async with async_client() as client:
+            return await generate_all(client)
+
+    def run_summary(self, posts):
+        """Roll per-post latency, attempts and tokens up into a run summary"""
+        return build_run_summary(posts, self.usage.report(), self.api_attempts)
+
     def get_backup_content(self, index):
         """Backup content if API fails"""
         backups = [
             "Trading is the hardest skill in the world.\n\nNot because of the charts...\nBut because it forces you to master yourself.\n\nDiscipline. Patience. Emotional control.\nMost people can't handle it.",
+            "'All in' is stupid.\n\nTrading is not one trade.\n\nTrading is thousands of small, boring, disciplined, positive EV decisions stacked quietly on top of each other.",
+            "Trading reveals your relationship with uncertainty, control, and being wrong.",
+            "The market is not your enemy.\nIt doesn't know you exist.\n\nYour habits are the opponent.\nYour blind reactions are the opponent.\nYour unexamined beliefs are the opponent.",
             "Most traders want the results, but not the process.\n\nAnd that is why they fail.",
+            "Good trading isn't about seeing further.\nIt's about reacting better.",
+            "In bull markets, buy dips and breakouts.\n\nIn bear markets, sell rallies and breakdowns.\n\nAnd systematically cut your losses when things aren't going your way.\n\nIt's really that simple.",
+            "The illusion of knowledge is far more dangerous than ignorance.",
             "Gold is up over $75, trading above $4,838. Gold is up almost $250 so far this week. I remember when moves like this took months. Now it happens in days.",
-            "The market is not your enemy.\nIt doesn't know you exist.\n\nYour habits are the opponent.\nYour blind reactions are the opponent.\nYour unexamined beliefs are the opponent.",
             "Most traders fail because they trade hope, not process.\n\n• Cut losses at -5%\n• Only size up after 3 wins\n• Trade the 1H chart\n• Let winners ride\n• No trades in first 30 min\n\nExecution is everything."
         ]
         return backups[(index - 1) % len(backups)]
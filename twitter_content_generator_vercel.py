@@ -2,11 +2,10 @@
 # This version generates 5 posts instead of 10 to fit within Vercel's 10-second timeout
 import os
 import schedule
-import time
 import json
 from datetime import datetime
 from pathlib import Path
-import requests
+from deepseek_client import post_completion
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -152,12 +151,11 @@ Write like the viral Twitter trading accounts: sharp, insightful, memorable."""
                 "stream": False
             }
 
-            response = requests.post(
-                "https://api.deepseek.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+            response, attempts = post_completion(headers, data)
+
+            if response is None:
+                print(f"API Exception: {attempts[-1]['error']}")
+                return None
 
             if response.status_code == 200:
                 result = response.json()
@@ -220,8 +218,6 @@ Write like the viral Twitter trading accounts: sharp, insightful, memorable."""
                 except UnicodeEncodeError:
                     print(f"  [BACKUP] Using backup content (Post #{i})")
 
-            time.sleep(0.5)  # Shorter delay for Vercel (but still avoid rate limits)
-
         print(f"\n[OK] Successfully generated {len(posts)} posts")
         return posts
 
@@ -2,17 +2,30 @@
 Simple web interface for Twitter Content Generator
 Makes it easy for clients to generate and view content
 """
-from flask import Flask, render_template_string, jsonify, send_file, request
+from flask import Flask, Response, render_template_string, jsonify, send_file, request
 import os
+import json
 from pathlib import Path
-from datetime import datetime
 from dotenv import load_dotenv
 from twitter_content_generator import TwitterContentGenerator
+from deepseek_client import connection_stats
+from circuit_breaker import get_circuit_breaker
+from metrics import instrument_app
+from tracing import get_tracer
+from post_store import get_post_file_cache
+from post_history import get_post_history
+from output_index import get_output_index
+from file_events import get_file_event_hub
+from job_queue import SUCCEEDED, QueueFullError, enqueue_response, get_job_queue, register_job_routes
 import glob
 
 load_dotenv()
 
 app = Flask(__name__)
+# Request counts/latency per route, plus /metrics for Prometheus
+instrument_app(app, "local")
+# /jobs/<id> and /jobs/<id>/stream for generation runs queued by POST /generate
+register_job_routes(app)
 
 # HTML Template with modern UI
 HTML_TEMPLATE = """
@@ -422,62 +435,144 @@ HTML_TEMPLATE = """
             const btn = document.getElementById('generateBtn');
             const loading = document.getElementById('loading');
             const successMsg = document.getElementById('successMessage');
+            const container = document.getElementById('postsContainer');
 
             btn.disabled = true;
             loading.classList.add('active');
             successMsg.classList.remove('active');
 
-            fetch('/generate', {
-                method: 'POST'
-            })
-            .then(response => response.json())
-            .then(data => {
+            // Show posts in the modal as they stream in
+            container.innerHTML = '';
+            document.getElementById('postsModal').classList.add('active');
+
+            // Queued like any other run; the job's event stream carries tokens as they arrive
+            fetch('/generate?stream=1', { method: 'POST' })
+                .then(response => response.json())
+                .then(job => {
+                    if (!job.success) {
+                        throw new Error(job.error);
+                    }
+                    followJob(job.stream_url);
+                })
+                .catch(error => {
+                    btn.disabled = false;
+                    loading.classList.remove('active');
+                    alert('Error: ' + error.message);
+                });
+        }
+
+        function followJob(streamUrl) {
+            const btn = document.getElementById('generateBtn');
+            const loading = document.getElementById('loading');
+            const successMsg = document.getElementById('successMessage');
+            const source = new EventSource(streamUrl);
+
+            source.addEventListener('token', event => {
+                const data = JSON.parse(event.data);
+                livePostContent(data.number).textContent += data.text;
+            });
+
+            source.addEventListener('post', event => {
+                const post = JSON.parse(event.data);
+                livePostContent(post.number).textContent = post.content;
+            });
+
+            source.addEventListener('complete', event => {
+                source.close();
+                const job = JSON.parse(event.data);
                 btn.disabled = false;
                 loading.classList.remove('active');
 
-                if (data.success) {
+                if (job.status === 'succeeded') {
                     successMsg.classList.add('active');
                     loadFiles();
                     setTimeout(() => successMsg.classList.remove('active'), 5000);
                 } else {
-                    alert('Error: ' + data.error);
+                    alert('Error: ' + job.error);
                 }
-            })
-            .catch(error => {
+            });
+
+            source.onerror = () => {
+                source.close();
                 btn.disabled = false;
                 loading.classList.remove('active');
-                alert('Error generating content: ' + error);
-            });
+                alert('Error generating content: connection lost');
+            };
+        }
+
+        function livePostContent(number) {
+            const container = document.getElementById('postsContainer');
+            let postItem = container.querySelector(`[data-number="${number}"]`);
+
+            if (!postItem) {
+                postItem = document.createElement('div');
+                postItem.className = 'post-item';
+                postItem.dataset.number = number;
+                postItem.innerHTML = `
+                    <div class="post-number">Post ${number}</div>
+                    <div class="post-content"></div>
+                `;
+                // Keep posts in format order even though they finish out of order
+                const next = Array.from(container.children).find(el => Number(el.dataset.number) > number);
+                container.insertBefore(postItem, next || null);
+            }
+
+            return postItem.querySelector('.post-content');
         }
 
         function loadFiles() {
             fetch('/files')
             .then(response => response.json())
-            .then(data => {
-                const filesList = document.getElementById('filesList');
+            .then(renderFiles);
+        }
 
-                if (data.files.length === 0) {
-                    filesList.innerHTML = '<p style="color: #657786; text-align: center; padding: 40px;">No files yet. Generate your first batch!</p>';
-                    return;
-                }
+        function renderFiles(data) {
+            const filesList = document.getElementById('filesList');
 
-                filesList.innerHTML = '';
-                data.files.forEach(file => {
-                    const fileItem = document.createElement('div');
-                    fileItem.className = 'file-item';
-                    fileItem.innerHTML = `
-                        <div class="file-info">
-                            <div class="file-name">${file.name}</div>
-                            <div class="file-date">${file.date}</div>
-                        </div>
-                        <div class="file-actions">
-                            <button class="btn-small btn-view" onclick="viewPosts('${file.txt_path}')">View Posts</button>
-                            <button class="btn-small btn-download" onclick="downloadFile('${file.pdf_path}')">Download PDF</button>
-                        </div>
-                    `;
-                    filesList.appendChild(fileItem);
-                });
+            if (data.files.length === 0) {
+                filesList.innerHTML = '<p style="color: #657786; text-align: center; padding: 40px;">No files yet. Generate your first batch!</p>';
+                return;
+            }
+
+            filesList.innerHTML = '';
+            data.files.forEach(file => {
+                const fileItem = document.createElement('div');
+                fileItem.className = 'file-item';
+                fileItem.innerHTML = `
+                    <div class="file-info">
+                        <div class="file-name">${file.name}</div>
+                        <div class="file-date">${file.date}</div>
+                    </div>
+                    <div class="file-actions">
+                        <button class="btn-small btn-view" onclick="viewPosts('${file.txt_path}')">View Posts</button>
+                        <button class="btn-small btn-download" onclick="downloadFile('${file.pdf_path}')">Download PDF</button>
+                    </div>
+                `;
+                filesList.appendChild(fileItem);
+            });
+        }
+
+        // The server pushes the file list whenever Output/ changes; poll only if push is unavailable
+        function watchFiles() {
+            const port = {{ events_port | tojson }};
+            if (!port || !window.EventSource) {
+                setInterval(loadFiles, 10000);
+                return;
+            }
+
+            const source = new EventSource(`${location.protocol}//${location.hostname}:${port}/events`);
+            let failures = 0;
+            source.addEventListener('files', event => {
+                failures = 0;
+                renderFiles(JSON.parse(event.data));
             });
+            source.onerror = () => {
+                // EventSource reconnects on its own; give up after repeated failures
+                if (++failures >= 5 || source.readyState === EventSource.CLOSED) {
+                    source.close();
+                    setInterval(loadFiles, 10000);
+                }
+            };
         }
 
         function viewPosts(txtPath) {
@@ -517,8 +612,7 @@ HTML_TEMPLATE = """
             });
         }
 
-        // Refresh files every 10 seconds
-        setInterval(loadFiles, 10000);
+        watchFiles();
     </script>
 </body>
 </html>
@@ -527,85 +621,154 @@ HTML_TEMPLATE = """
 @app.route('/')
 def index():
     """Main dashboard page"""
-    return render_template_string(HTML_TEMPLATE)
+    hub = get_file_event_hub()
+    return render_template_string(HTML_TEMPLATE, events_port=hub.port if hub.running else None)
+
+def run_generation_job(api_key, job=None):
+    """One full daily run (posts, PDF, text, history); reports each post to job if given"""
+    generator = TwitterContentGenerator(api_key)
+    if job:
+        job.set_total(len(generator.prompts))
+        generator.post_callback = job.post_done
+    try:
+        generator.run_daily_generation(raise_errors=True)
+    except Exception:
+        get_file_event_hub().publish('run_complete', {'success': False})
+        raise
+    get_file_event_hub().publish('run_complete', {'success': True})
+    return {'success': True, 'run_id': generator.run_id}
+
+def run_stream_job(api_key, job):
+    """A daily run streamed token by token: tokens and posts go to job as they arrive, then files are saved"""
+    generator = TwitterContentGenerator(api_key)
+    job.set_total(len(generator.prompts))
+    posts_by_number = {}
+
+    for event, payload in generator.stream_daily_posts():
+        if event == 'token':
+            job.token(payload['number'], payload['text'])
+        else:
+            # A regenerated near-duplicate replaces the post streamed earlier
+            posts_by_number[payload['number']] = payload
+            job.post_done(payload)
+
+    posts = [posts_by_number[i] for i in sorted(posts_by_number)]
+    generator.create_pdf(posts)
+    generator.save_as_text(posts)
+    generator.save_as_jsonl(posts)
+    generator.save_to_history(posts)
+    generator.save_run_summary(posts)
+    get_file_event_hub().publish('run_complete', {'success': True})
+    return {'success': True, 'run_id': generator.run_id}
 
 @app.route('/generate', methods=['POST'])
 def generate():
-    """Generate new content"""
+    """Queue a generation run and return its job id (202); ?wait=1 runs it in the request instead
+
+    ?stream=1 queues a streamed run whose /jobs/<id>/stream also carries
+    'token' events (the dashboard uses this).
+    """
     try:
         api_key = os.getenv("DEEPSEEK_API_KEY")
         if not api_key:
             return jsonify({'success': False, 'error': 'API key not configured'})
 
-        generator = TwitterContentGenerator(api_key)
-        success = generator.run_daily_generation()
-
-        return jsonify({'success': success})
+        if request.args.get('wait') == '1':
+            return jsonify(run_generation_job(api_key))
+        if request.args.get('stream') == '1':
+            return enqueue_response('daily_generation_stream', lambda job: run_stream_job(api_key, job))
+        return enqueue_response('daily_generation', lambda job: run_generation_job(api_key, job))
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
-@app.route('/files')
-def list_files():
-    """List generated files"""
-    output_folder = Path('Output')
-    if not output_folder.exists():
-        return jsonify({'files': []})
+@app.route('/generate/stream')
+def generate_stream():
+    """Generate new content, streaming posts token by token as Server-Sent Events
 
-    pdf_files = sorted(output_folder.glob('Twitter_Posts_*.pdf'), reverse=True)
+    The run is a queued streamed job like POST /generate?stream=1, so it
+    counts against the same worker pool; this route relays its events.
+    """
+    api_key = os.getenv("DEEPSEEK_API_KEY")
 
-    files = []
-    for pdf_file in pdf_files:
-        txt_file = pdf_file.with_suffix('.txt')
-        date_str = pdf_file.stem.split('_')[-1]
+    def events():
+        if not api_key:
+            yield sse_event('complete', {'success': False, 'error': 'API key not configured'})
+            return
 
-        # Format date
         try:
-            date_obj = datetime.strptime(date_str, '%Y%m%d')
-            formatted_date = date_obj.strftime('%B %d, %Y')
-        except:
-            formatted_date = date_str
-
-        files.append({
-            'name': pdf_file.name,
-            'date': formatted_date,
-            'pdf_path': pdf_file.name,
-            'txt_path': txt_file.name if txt_file.exists() else None
-        })
+            job = get_job_queue().submit('daily_generation_stream', lambda job: run_stream_job(api_key, job))
+        except QueueFullError as e:
+            yield sse_event('complete', {'success': False, 'error': f"Too many generation jobs: {e}"})
+            return
+
+        for event, payload in job.follow():
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif event == 'complete':
+                yield sse_event('complete', {'success': job.status == SUCCEEDED, 'error': job.error})
+            elif event != 'status':
+                yield sse_event(event, payload)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    return jsonify({'files': files})
+@app.route('/files')
+def list_files():
+    """List generated files
+
+    The listing is cached until Output/ changes and carries an ETag and
+    Last-Modified, so a dashboard poll with nothing new gets an empty 304.
+    """
+    snapshot = get_output_index('Output').snapshot()
+    response = Response(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    if snapshot.last_modified:
+        response.last_modified = snapshot.last_modified
+    # Let browsers keep the listing but revalidate it on every poll
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/view/<filename>')
 def view_file(filename):
-    """View content of text file"""
+    """Posts of one run, from its JSONL records (or the .txt for older runs)
+
+    Parsed files are cached until they change on disk.
+    """
     try:
         filepath = Path('Output') / filename
         if not filepath.exists():
             return jsonify({'error': 'File not found'}), 404
 
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Parse posts from text file
-        posts = []
-        lines = content.split('\n')
-        current_post = []
-
-        for line in lines:
-            if line.strip().startswith(('1.', '2.', '3.', '4.', '5.', '6.', '7.', '8.', '9.', '10.')):
-                if current_post:
-                    posts.append('\n'.join(current_post).strip())
-                current_post = [line.split('.', 1)[1].strip() if '.' in line else line]
-            elif line.strip() == '-' * 60:
-                if current_post:
-                    posts.append('\n'.join(current_post).strip())
-                    current_post = []
-            elif line.strip() and not line.startswith('=') and 'Daily Twitter' not in line and 'Date:' not in line and 'Time:' not in line:
-                current_post.append(line)
-
-        if current_post:
-            posts.append('\n'.join(current_post).strip())
-
-        return jsonify({'posts': posts})
+        records = get_post_file_cache().load(filepath)
+        return jsonify({'posts': [record['content'] for record in records], 'records': records})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/search')
+def search_posts():
+    """Full-text search over every generated post
+
+    ?q=<words> (all must match; word* matches a prefix), &page=N,
+    &per_page=N (max 100), &format=N, &since=/&until=YYYY-MM-DD,
+    &sort=newest|relevance.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query (?q=)'}), 400
+    try:
+        return jsonify(get_post_history().search(
+            query,
+            page=request.args.get('page', default=1, type=int),
+            per_page=request.args.get('per_page', default=20, type=int),
+            number=request.args.get('format', type=int),
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            sort=request.args.get('sort', 'newest')
+        ))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -618,12 +781,39 @@ def download_file(filename):
 
     return send_file(filepath, as_attachment=True)
 
+@app.route('/connection-stats')
+def get_connection_stats():
+    """Report DeepSeek connection pool reuse"""
+    return jsonify(connection_stats())
+
+@app.route('/circuit-breaker')
+def get_circuit_breaker_state():
+    """Report the DeepSeek circuit breaker state"""
+    return jsonify(get_circuit_breaker().stats())
+
+@app.route('/file-events')
+def get_file_events_state():
+    """Report the file update push server (port, connected dashboards)"""
+    return jsonify(get_file_event_hub().stats())
+
+@app.route('/traces')
+def get_traces():
+    """Recent stage timing spans (?run=<id> for one run, ?limit=N)"""
+    buffer = get_tracer().ring_buffer()
+    if buffer is None:
+        return jsonify({'spans': [], 'error': 'in-memory trace sink disabled (TRACE_SINKS)'})
+    limit = request.args.get('limit', default=200, type=int)
+    return jsonify({'spans': buffer.recent(limit=limit, run=request.args.get('run'))})
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("Twitter Content Generator - Web Interface")
     print("="*60)
     print("\nStarting web server...")
     print("Open your browser to: http://localhost:5000")
+    # File list updates are pushed to open dashboards from a separate port
+    if get_file_event_hub().start():
+        print(f"File updates pushed on port {get_file_event_hub().port}")
     print("\nPress Ctrl+C to stop")
     print("="*60 + "\n")
 
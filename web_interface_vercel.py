@@ -3,15 +3,28 @@ Web interface for Twitter Content Generator - VERCEL SERVERLESS
 Clean, zen, black and white design
 No file I/O - works in read-only serverless environment
 """
-from flask import Flask, render_template_string, jsonify, request
+from flask import Flask, Response, render_template_string, jsonify, request
 import os
+import json
 from datetime import datetime
 from dotenv import load_dotenv
 from twitter_content_generator_serverless import TwitterContentGenerator
+from deepseek_client import connection_stats
+from circuit_breaker import get_circuit_breaker
+from metrics import instrument_app
+from job_queue import enqueue_response, register_job_routes
 
 load_dotenv()
 
 app = Flask(__name__)
+# Request counts/latency per route, plus /metrics for Prometheus
+instrument_app(app, "vercel")
+# /jobs/<id> and /jobs/<id>/stream for generation runs queued by POST /generate
+register_job_routes(app)
+
+# Vercel may freeze the instance once a response is sent, and job state lives in one
+# instance's memory, so POST /generate only queues when running as a long-lived server
+QUEUE_JOBS = not os.getenv("VERCEL")
 
 # In-memory storage for generated posts (lost on restart, but that's ok for serverless)
 posts_cache = []
@@ -474,7 +487,7 @@ HTML_TEMPLATE = """
                 <h2>Generate</h2>
 
                 <div class="status-line">
-                    Optimized for 5 posts / ~8 second generation
+                    10 posts / 8 second deadline
                 </div>
 
                 <div class="success-message" id="successMessage">
@@ -482,7 +495,7 @@ HTML_TEMPLATE = """
                 </div>
 
                 <button class="generate-btn" id="generateBtn" onclick="generateContent()">
-                    Generate 5 Posts
+                    Generate 10 Posts
                 </button>
 
                 <div class="loading" id="loading">
@@ -493,7 +506,7 @@ HTML_TEMPLATE = """
                 <div class="info-box">
                     <h3>Output</h3>
                     <ul class="info-list">
-                        <li>5 unique posts</li>
+                        <li>10 unique posts</li>
                         <li>Trading psychology</li>
                         <li>Market commentary</li>
                         <li>Educational content</li>
@@ -591,10 +604,25 @@ HTML_TEMPLATE = """
             btn.disabled = true;
             loading.classList.add('active');
             successMsg.classList.remove('active');
+            document.getElementById('filesList').innerHTML = '';
 
-            fetch('/generate', { method: 'POST' })
-            .then(response => response.json())
-            .then(data => {
+            const source = new EventSource('/generate/stream');
+            const liveText = {};
+
+            source.addEventListener('token', event => {
+                const data = JSON.parse(event.data);
+                liveText[data.number] = (liveText[data.number] || '') + data.text;
+                livePostPreview(data.number).textContent = liveText[data.number];
+            });
+
+            source.addEventListener('post', event => {
+                const post = JSON.parse(event.data);
+                livePostPreview(post.number).textContent = post.content;
+            });
+
+            source.addEventListener('complete', event => {
+                source.close();
+                const data = JSON.parse(event.data);
                 btn.disabled = false;
                 loading.classList.remove('active');
 
@@ -605,12 +633,35 @@ HTML_TEMPLATE = """
                 } else {
                     alert('Error: ' + data.error);
                 }
-            })
-            .catch(error => {
+            });
+
+            source.onerror = () => {
+                source.close();
                 btn.disabled = false;
                 loading.classList.remove('active');
-                alert('Error: ' + error);
-            });
+                alert('Error: connection lost');
+            };
+        }
+
+        function livePostPreview(number) {
+            const filesList = document.getElementById('filesList');
+            let fileItem = filesList.querySelector(`[data-number="${number}"]`);
+
+            if (!fileItem) {
+                fileItem = document.createElement('div');
+                fileItem.className = 'file-item';
+                fileItem.dataset.number = number;
+                fileItem.innerHTML = `
+                    <div class="file-info">
+                        <div class="file-name">Post ${number}</div>
+                        <div class="file-date"></div>
+                    </div>
+                `;
+                const next = Array.from(filesList.children).find(el => Number(el.dataset.number) > number);
+                filesList.insertBefore(fileItem, next || null);
+            }
+
+            return fileItem.querySelector('.file-date');
         }
 
         function displayPosts(posts) {
@@ -692,29 +743,85 @@ HTML_TEMPLATE = """
 def index():
     return render_template_string(HTML_TEMPLATE)
 
+def run_generation_job(api_key, job=None):
+    """Generate posts into the in-memory cache; reports each post to job if given"""
+    generator = TwitterContentGenerator(api_key)
+    if job:
+        job.set_total(len(generator.prompts))
+        generator.post_callback = job.post_done
+    posts = generator.generate_posts()
+
+    # Store in memory cache
+    global posts_cache
+    posts_cache = posts
+
+    return {
+        'success': True,
+        'posts': posts,
+        'summary': generator.run_summary(posts),
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
 @app.route('/generate', methods=['POST'])
 def generate():
+    """Generate posts and return them; as a long-lived server, queue the run instead
+
+    Outside Vercel (VERCEL unset) the run is queued and its job id returned
+    (202); ?wait=1 returns the posts directly. On Vercel the run always
+    happens in the request, since a queued job could be frozen or polled
+    on another instance.
+    """
     try:
         api_key = os.getenv("DEEPSEEK_API_KEY")
         if not api_key:
             return jsonify({'success': False, 'error': 'API key not configured'})
 
-        generator = TwitterContentGenerator(api_key)
-        posts = generator.generate_posts()
-
-        # Store in memory cache
-        global posts_cache
-        posts_cache = posts
-
-        # Return posts directly
-        return jsonify({
-            'success': True,
-            'posts': posts,
-            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        })
+        if not QUEUE_JOBS or request.args.get('wait') == '1':
+            return jsonify(run_generation_job(api_key))
+        return enqueue_response('generate_posts', lambda job: run_generation_job(api_key, job))
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/generate/stream')
+def generate_stream():
+    """Generate posts, streaming them token by token as Server-Sent Events"""
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+
+    def events():
+        if not api_key:
+            yield sse_event('complete', {'success': False, 'error': 'API key not configured'})
+            return
+
+        try:
+            generator = TwitterContentGenerator(api_key)
+            posts = []
+
+            for event, payload in generator.stream_posts():
+                if event == 'post':
+                    posts.append(payload)
+                yield sse_event(event, payload)
+
+            posts.sort(key=lambda post: post['number'])
+
+            # Store in memory cache
+            global posts_cache
+            posts_cache = posts
+
+            yield sse_event('complete', {
+                'success': True,
+                'posts': posts,
+                'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+        except Exception as e:
+            yield sse_event('complete', {'success': False, 'error': str(e)})
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.route('/posts')
 def get_posts():
     """Return cached posts"""
@@ -724,6 +831,16 @@ def get_posts():
 
     return jsonify({'posts': posts_cache})
 
+@app.route('/connection-stats')
+def get_connection_stats():
+    """Report DeepSeek connection pool reuse"""
+    return jsonify(connection_stats())
+
+@app.route('/circuit-breaker')
+def get_circuit_breaker_state():
+    """Report the DeepSeek circuit breaker state"""
+    return jsonify(get_circuit_breaker().stats())
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("Twitter Content Generator - Vercel Optimized")